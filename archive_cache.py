@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/archive_cache.py. Importing archive_cache still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import archive_cache
+
+sys.modules[__name__] = archive_cache
@@ -0,0 +1,55 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fhfa_pudb.fast_parser import read_loans
+from fhfa_pudb.pudb_schema import SINGLEFAMILY_CENSUS_COLNAMES, SINGLEFAMILY_CENSUS_DTYPES
+from synthetic_pudb import census_tract_frame, write_loans
+
+# Checks that fast_parser.read_loans returns the same values as the pd.read_csv based
+# parse_singlefamily_census, and reports the throughput of each in rows per second on a
+# synthetic Census Tract file (synthetic_pudb.py).
+#
+# usage: python benchmarks/bench_parser.py --rows 2000000
+
+
+def parse_pandas(path):
+    return pd.read_csv(path, names=SINGLEFAMILY_CENSUS_COLNAMES, delimiter=r'\s+')
+
+
+def parse_fast(path, engine):
+    with open(path, "rb") as f:
+        return read_loans(f, SINGLEFAMILY_CENSUS_COLNAMES, SINGLEFAMILY_CENSUS_DTYPES, engine=engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "loans.txt")
+        # like the 2022 files, rows stop before the last (empty) field
+        with open(path, "wb") as f:
+            write_loans(f, [census_tract_frame(args.rows, args.seed)], trailing_empty=True)
+        print(f"{args.rows} rows, {os.path.getsize(path) / 1e6:.0f} MB")
+
+        start = time.perf_counter()
+        expected = parse_pandas(path)
+        elapsed = time.perf_counter() - start
+        print(f"pd.read_csv:        {args.rows / elapsed:12,.0f} rows/s")
+
+        for engine in ["arrow", "pandas"]:
+            start = time.perf_counter()
+            actual = parse_fast(path, engine)
+            elapsed = time.perf_counter() - start
+            # the fast parser takes dtypes from the schema instead of inferring them, so only values are compared
+            pd.testing.assert_frame_equal(actual, expected, check_dtype=False, check_exact=True)
+            print(f"read_loans ({engine}): {args.rows / elapsed:12,.0f} rows/s")
@@ -0,0 +1,128 @@
+import argparse
+import functools
+import gzip
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from query_service import make_server
+
+# Compares fetching one metric for one year from query_service.py with what the
+# visualization does today: download county_averages_by_year.csv and parse all of it.
+# Reports latency (median of --requests requests) and bytes transferred for each,
+# served over HTTP on localhost with gzip.
+#
+# usage: python benchmarks/bench_query_service.py [--csv county_averages_by_year.csv]
+
+METRICS = ["dti_avg", "ltv_avg", "income_estimate", "pct_nonwhite_estimate", "pct_first_time_buyer"]
+
+
+def make_csv(path, counties=3100, years=range(2018, 2023), seed=0):
+    # same shape as the pipeline output: one row per county, <metric>_<year> columns
+    rng = np.random.default_rng(seed)
+    index = pd.Index(sorted({f"{rng.integers(1, 57):02d}{rng.integers(1, 400) * 2 - 1:03d}" for _ in range(counties)}),
+                     name="county")
+    columns = {}
+    for year in years:
+        columns[f"dti_avg_{year}"] = rng.normal(36, 4, len(index)).round(3)
+        columns[f"ltv_avg_{year}"] = rng.normal(75, 8, len(index)).round(3)
+        columns[f"income_estimate_{year}"] = rng.normal(80000, 20000, len(index)).round(0).astype(int)
+        columns[f"pct_nonwhite_estimate_{year}"] = rng.uniform(0, 90, len(index)).round(3)
+        columns[f"pct_first_time_buyer_{year}"] = rng.uniform(10, 60, len(index)).round(3)
+    pd.DataFrame(columns, index=index).to_csv(path)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def fetch(url, etag=None):
+    # returns (decoded body, bytes on the wire)
+    request = urllib.request.Request(url, headers={"Accept-Encoding": "gzip"})
+    if etag:
+        request.add_header("If-None-Match", etag)
+    try:
+        with urllib.request.urlopen(request) as response:
+            data = response.read()
+            if response.headers.get("Content-Encoding") == "gzip":
+                return gzip.decompress(data), len(data), response.headers.get("ETag")
+            return data, len(data), response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, 0, etag
+        raise
+
+
+def timed(func, requests):
+    times = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", help="aggregates to serve (default: a generated file of the same shape)")
+    parser.add_argument("--metric", default="dti_avg")
+    parser.add_argument("--year", type=int, default=2022)
+    parser.add_argument("--state", default="06")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            path = os.path.join(tmp, "county_averages_by_year.csv")
+            make_csv(path)
+        directory, name = os.path.split(os.path.abspath(path))
+
+        handler = functools.partial(QuietHandler, directory=directory)
+        static = serve(ThreadingHTTPServer(("127.0.0.1", 0), handler))
+        service = serve(make_server(path, port=0, verbose=False))
+
+        def full_csv():
+            data, size, _ = fetch(f"{static}/{name}")
+            df = pd.read_csv(io.BytesIO(data), dtype={"county": str})
+            return df.set_index("county")[f"{args.metric}_{args.year}"], size
+
+        def query(state=None, etag=None):
+            url = f"{service}/counties?metric={args.metric}&year={args.year}" + (f"&state={state}" if state else "")
+            data, size, etag = fetch(url, etag)
+            return (json.loads(data)["values"] if data else None), size, etag
+
+        (series, csv_bytes), csv_ms = timed(full_csv, args.requests)
+        (values, query_bytes, etag), query_ms = timed(query, args.requests)
+        start = time.perf_counter()
+        _, state_bytes, _ = query(args.state)
+        cold_state_ms = (time.perf_counter() - start) * 1000
+        (_, state_bytes, _), state_ms = timed(lambda: query(args.state), args.requests)
+        (_, revalidate_bytes, _), revalidate_ms = timed(lambda: query(etag=etag), args.requests)
+
+        assert len(values) == series.notna().sum()
+        print(f"{len(series)} counties, {args.metric} {args.year}")
+        with open(path, "rb") as f:
+            csv_gzip_bytes = len(gzip.compress(f.read()))
+        print(f"full CSV download + parse:     {csv_ms:7.2f} ms {csv_bytes:10,} bytes ({csv_gzip_bytes:,} gzipped)")
+        print(f"query one metric/year (gzip):  {query_ms:7.2f} ms {query_bytes:10,} bytes")
+        print(f"query one state, first/after:  {cold_state_ms:7.2f} / {state_ms:.2f} ms {state_bytes:10,} bytes")
+        print(f"revalidate with ETag (304):    {revalidate_ms:7.2f} ms {revalidate_bytes:10,} bytes")
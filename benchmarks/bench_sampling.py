@@ -0,0 +1,69 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic_pudb
+from fhfa_pudb.archive_cache import ArchiveCache
+from fhfa_pudb.instrumentation import RSSSampler
+
+# Draws a sample of one synthetic Census Tract file and cleans it, two ways:
+#   full       parse the whole file, clean it, then df.sample(frac=...) like the notebooks
+#   streaming  sampling.sample_chunks over the file's chunks, then clean only the sample
+# and reports the time and peak memory of each. Archives are read from local files, so
+# download time is left out.
+#
+# usage: python benchmarks/bench_sampling.py --rows 1000000 --fraction 0.01 --stratify county
+
+DATASET = "Singlefamily-Census-Freddie"
+YEAR = 2022
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    with RSSSampler() as memory:
+        df = func()
+    seconds = time.perf_counter() - start
+    print(f"{name:<10} {seconds:8.2f} s {memory.peak_delta_mb or 0:8.0f} MB {len(df):>10} rows")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000, help="loans in the file")
+    parser.add_argument("--fraction", type=float, default=0.01)
+    parser.add_argument("--stratify", default=None, help="state, county, dti_cat or a column name")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic file")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    args = parser.parse_args()
+
+    from fhfa_pudb.cleaning import clean_df
+    from fhfa_pudb.ingest import DEFAULT_CHUNKSIZE, iter_chunks, open_member
+    from fhfa_pudb.sources import get_parser
+    from fhfa_pudb.sampling import sample_chunks
+
+    out_dir = os.path.join(args.data_dir, f"{args.rows}_{args.seed}")
+    archive_name, member = synthetic_pudb.ARCHIVES[DATASET]
+    archive = os.path.join(out_dir, archive_name.format(year=YEAR))
+    if not os.path.exists(archive):
+        print(f"generating {args.rows} rows of {DATASET} {YEAR}...")
+        synthetic_pudb.write_archive(out_dir, DATASET, YEAR, args.rows, seed=args.seed)
+    url, member, parse = "file://" + os.path.abspath(archive), member.format(year=YEAR), get_parser(DATASET, YEAR)
+
+    def full():
+        with open_member(DATASET, YEAR, url, member, cache=cache) as fileobj:
+            df = parse(fileobj)
+        return clean_df(df, YEAR).sample(frac=args.fraction, random_state=42)
+
+    def streaming():
+        chunks = iter_chunks(DATASET, YEAR, url, member, parse, chunksize=DEFAULT_CHUNKSIZE, cache=cache)
+        return clean_df(sample_chunks(chunks, args.fraction, stratify=args.stratify), YEAR)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ArchiveCache(cache_dir)
+        measure("full", full)
+        measure("streaming", streaming)
@@ -0,0 +1,85 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic_pudb
+from fhfa_pudb.archive_cache import ArchiveCache
+from fhfa_pudb.instrumentation import RSSSampler
+
+# Loads "one state, a few years, two columns" of synthetic Census Tract files two ways:
+#   eager      parse every file completely (like get_data), then filter and select
+#   scan cold  scanner.Scan on an empty store: parses each file once into its store
+#   scan warm  the same scan again, reading only the state's files and the two columns
+# and reports the time and peak memory of each. Archives are read from local files, so
+# download time is left out.
+#
+# usage: python benchmarks/bench_scanner.py --rows 1000000 --years 2020 2021 2022 --state 13
+
+DATASETS = ["Singlefamily-Census-Fannie", "Singlefamily-Census-Freddie"]
+
+
+def fixtures(data_dir, rows, years, seed):
+    out_dir = os.path.join(data_dir, f"{rows}_{seed}")
+    for year in years:
+        for dataset in DATASETS:
+            archive_name, _ = synthetic_pudb.ARCHIVES[dataset]
+            if not os.path.exists(os.path.join(out_dir, archive_name.format(year=year))):
+                print(f"generating {rows} rows of {dataset} {year}...")
+                synthetic_pudb.write_archive(out_dir, dataset, year, rows, seed=seed)
+    return out_dir
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    with RSSSampler() as memory:
+        df = func()
+    seconds = time.perf_counter() - start
+    print(f"{name:<10} {seconds:8.2f} s {memory.peak_delta_mb or 0:8.0f} MB {len(df):>10} rows")
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000, help="loans per file")
+    parser.add_argument("--years", type=int, nargs="+", default=[2020, 2021, 2022])
+    parser.add_argument("--state", type=int, default=13)
+    parser.add_argument("--columns", nargs="+", default=["ltv", "dti"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    args = parser.parse_args()
+
+    from fhfa_pudb.ingest import open_member
+    from fhfa_pudb.sources import get_parser
+    from fhfa_pudb.scanner import Scan
+
+    out_dir = fixtures(args.data_dir, args.rows, args.years, args.seed)
+
+    def source(dataset, year):
+        archive_name, member = synthetic_pudb.ARCHIVES[dataset]
+        url = "file://" + os.path.join(os.path.abspath(out_dir), archive_name.format(year=year))
+        return url, member.format(year=year), get_parser(dataset, year)
+
+    def eager():
+        frames = []
+        for year in args.years:
+            for dataset in DATASETS:
+                url, member, parse = source(dataset, year)
+                with open_member(dataset, year, url, member, cache=cache) as fileobj:
+                    df = parse(fileobj)
+                frames.append(df.loc[df["state_fips_code"] == args.state, args.columns].assign(year=year))
+                del df
+        return pd.concat(frames, ignore_index=True)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ArchiveCache(cache_dir)
+        scan = Scan(DATASETS, args.years, source, cache=cache).filter(state=args.state).select(*args.columns)
+        measure("eager", eager)
+        measure("scan cold", scan.to_pandas)
+        measure("scan warm", scan.to_pandas)
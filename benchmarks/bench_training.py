@@ -0,0 +1,74 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fhfa_pudb.cleaning import clean_df
+from synthetic_pudb import census_tract_frame
+
+# Fit time, peak memory and test score of the notebook's 10% sample random forests
+# (training.train_baseline) next to histogram gradient boosting on all rows
+# (training.train), for the DTI classifier and the LTV regressor. Every fit runs in
+# its own process, so memory freed by one doesn't lower the RSS the next starts from.
+#
+# Uses synthetic data by default (scores are meaningless there, only time and memory
+# are); --year loads the real Freddie Mac Census Tract file for that year instead.
+#
+# usage: python benchmarks/bench_training.py --rows 1800000
+#        python benchmarks/bench_training.py --year 2022
+
+
+def run(path, task, kind, jobs, budget):
+    import training
+
+    df = pd.read_pickle(path)
+    if kind == "baseline":
+        _, report = training.train_baseline(df, task, n_jobs=jobs)
+    else:
+        _, report = training.train(df, task, memory_budget_mb=budget, n_jobs=jobs)
+    return report
+
+
+def load(args):
+    if args.year is None:
+        return clean_df(census_tract_frame(args.rows, args.seed), None)
+    from fhfa_pudb.sources import get_data
+    return clean_df(get_data("Singlefamily-Census-Freddie", args.year), args.year)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_800_000, help="synthetic rows (the 2022 Freddie Mac file has 1.8M)")
+    parser.add_argument("--year", type=int, help="use the real Freddie Mac file of this year")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--memory-budget", type=int, default=2048, help="MB")
+    parser.add_argument("--tasks", nargs="+", default=["dti", "ltv"])
+    parser.add_argument("--output", help="also write the reports to this JSON file")
+    args = parser.parse_args()
+
+    reports = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "clean.pkl")
+        load(args).to_pickle(path)
+        for task in args.tasks:
+            for kind in ["baseline", "full"]:
+                # not a multiprocessing.Pool: its daemon workers can't start the random forest's worker processes
+                with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    report = pool.submit(run, path, task, kind, args.jobs, args.memory_budget).result()
+                reports.append(report)
+                scores = ", ".join(f"{key} {report[key]:.4f}" for key in ["accuracy", "rmse", "r2"] if key in report)
+                print(f"{task} {report['model']:>30}: {report['train_rows']:>9,} rows x {report['features']:>3} features, "
+                      f"fit {report['fit_seconds']:7.1f}s, peak +{report['peak_rss_delta_mb']:7.0f} MB, {scores}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=2)
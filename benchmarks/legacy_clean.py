@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+# The original clean_df from calculate_county_averages.py (based on code by Ning Xia),
+# kept as the reference implementation for cleaning.clean_df: bench_clean.py checks
+# that both produce the same frame and compares their run time.
+
+def map_dti_to_label(dti):
+    if dti in {10,20,30}:
+        return '<= 35%'
+    elif 36 <= dti <= 98:
+        return '> 35%'
+
+def clean_df(df): # based on code by Ning Xia
+    df_clean = df.copy()
+    df_clean = df_clean.iloc[:, 2:63]
+    df_clean = df_clean.replace('', np.nan)
+
+    # TODO filter columns
+
+    cols_wt_missing_vals = ['state_fips_code', 'borrower_income', 'upb', 'purpose', 'federal_guarantee', 'num_borrowers',
+                            'occupancy_code', 'HOEPA_status', 'property_type', 'lien_status', 'date_of_note',
+                            'term_at_orig', 'num_units', 'rural_tract', 'mississippi_delta_county', 'mid_appalachia_county',
+                            'persistent_poverty_county', 'area_concentrated_poverty', 'high_opportunity_area']  #19
+
+    cols_missing_vals_gt_5pct = ['borrower_race_1', 'borrower_race_2', 'borrower_race_3', 'borrower_race_4',
+                                'borrower_race', 'borrower_ethnicity', 'co-borrower_race_1', 'co-borrower_race_2',
+                                'co-borrower_race_3', 'co-borrower_race_4', 'co-borrower_race', 'co-borrower_ethnicity',
+                                'borrower_gender', 'co-borrower_gender', 'co-borrower_age', 'rate_spread',
+                                'co-borrower_62+', 'preapproval', 'borrower_credit_model', 'co-borrower_credit_model',
+                                'discount_points', 'intro_rate_period', 'land_property_interest'] #23
+
+    cols_missing_vals_le_5pct = ['msa_code', 'county_fips_code', 'census_tract', 'tract_pct_minority',
+                                'tract_median_income', 'local_median_income', 'tract_income_ratio',
+                                'local_median_family_income', 'borrower_income_ratio', 'first_time_buyer', 'borrower_age',
+                                'borrower_62+', 'ltv', 'rate_at_orig', 'note_amount', 'application_channel', 'AUS_name',
+                                'property_value', "dti"] #19
+
+    cols_keep = df_clean.columns.difference(cols_missing_vals_gt_5pct)
+
+    df_clean = df_clean[cols_keep]
+
+    df_clean = df_clean.drop(['HOEPA_status', 'lien_status'], axis=1)   # 36 cols
+    cols_wt_missing_vals = list(set(cols_wt_missing_vals) - set(['HOEPA_status', 'lien_status']))
+
+    # map dti
+    df_clean.loc[:, 'dti'] = df_clean['dti'].apply(map_dti_to_label)
+    df_clean.rename(columns={'dti': 'dti_cat'}, inplace=True)
+    df_clean.loc[:, 'dti_num'] = df.loc[:, 'dti']
+
+    # set these column types as categorical: 24 cols
+    cols_categ = ['msa_code', 'census_tract', 'purpose', 'federal_guarantee',
+                'borrower_age', 'occupancy_code', 'property_type', 'borrower_62+', 'date_of_note',
+                'application_channel', 'AUS_name', 'dti_cat', 'rural_tract', 'mississippi_delta_county',
+                'mid_appalachia_county', 'persistent_poverty_county', 'area_concentrated_poverty',
+                'high_opportunity_area', "num_units", "num_borrowers", "term_at_orig"]
+
+    df_clean[cols_categ] = df_clean[cols_categ].apply(lambda x: x.astype('category'))
+
+    cols_fips = ['state_fips_code', 'county_fips_code']
+
+    # numerical variables which need imputation
+    cols_imput_num = ['tract_pct_minority', 'tract_median_income', 'local_median_income', 'tract_income_ratio',
+                    'local_median_family_income', 'borrower_income_ratio', 'ltv', 'rate_at_orig', 'note_amount',
+                    'property_value', 'dti_num']  # 11 cols
+    # categorical variables which need imputation
+    cols_imput_cat = ['msa_code', 'county_fips_code', 'census_tract', 'first_time_buyer', 'borrower_age',
+                    'borrower_62+', 'application_channel', 'AUS_name', "dti_cat"] # 9 cols
+
+    # imputation for numerical variables
+    df_cols_imput_num = df_clean[cols_imput_num]
+    df_cols_imput_num.loc[:, 'tract_pct_minority'] = [np.nan if val == 9999.0 else val for val in df_cols_imput_num['tract_pct_minority']]
+    df_cols_imput_num.loc[:, 'tract_median_income'] = [np.nan if val == 999999 else val for val in df_cols_imput_num['tract_median_income']]
+    df_cols_imput_num.loc[:, 'local_median_income'] = [np.nan if val == 999999 else val for val in df_cols_imput_num['local_median_income']]
+    df_cols_imput_num.loc[:, 'tract_income_ratio'] = [np.nan if val == 9999.000 else val for val in df_cols_imput_num['tract_income_ratio']]
+    df_cols_imput_num.loc[:, 'local_median_family_income'] = [np.nan if val == 999999 else val for val in df_cols_imput_num['local_median_family_income']]
+    df_cols_imput_num.loc[:, 'borrower_income_ratio'] = [np.nan if val == 9999.000 else val for val in df_cols_imput_num['borrower_income_ratio']]
+    df_cols_imput_num.loc[:, 'ltv'] = [np.nan if val == 999.00 else val for val in df_cols_imput_num['ltv']]
+    df_cols_imput_num.loc[:, 'rate_at_orig'] = [np.nan if val == 99.000 else val for val in df_cols_imput_num['rate_at_orig']]
+    df_cols_imput_num.loc[:, 'note_amount'] = [np.nan if val == 999999999 else val for val in df_cols_imput_num['note_amount']]
+    df_cols_imput_num.loc[:, 'property_value'] = [np.nan if val == 999999999 else val for val in df_cols_imput_num['property_value']]
+    df_cols_imput_num.loc[:, 'dti_num'] = [np.nan if val == 99 else val for val in df_cols_imput_num['dti_num']]
+    # median values for numerical columns which need imputation
+    median_vals_num = df_cols_imput_num.median()
+    # replace NAs with median values in each numerical columns
+    df_cols_imputed_num = df_cols_imput_num.fillna(median_vals_num)
+
+    # imputation for categorical variables
+    df_cols_imput_cat = df_clean[cols_imput_cat]
+    df_cols_imput_cat.loc[:, 'msa_code'] = [np.nan if val == 0 else val for val in df_cols_imput_cat['msa_code']]
+    df_cols_imput_cat.loc[:, 'county_fips_code'] = [np.nan if val == 0 else val for val in df_cols_imput_cat['county_fips_code']]
+    df_cols_imput_cat.loc[:, 'census_tract'] = [np.nan if val == 0 else val for val in df_cols_imput_cat['census_tract']]
+    df_cols_imput_cat.loc[:, 'first_time_buyer'] = [np.nan if val == 9 else val for val in df_cols_imput_cat['first_time_buyer']]
+    df_cols_imput_cat.loc[:, 'borrower_age'] = [np.nan if val == 9 else val for val in df_cols_imput_cat['borrower_age']]
+    df_cols_imput_cat.loc[:, 'borrower_62+'] = [np.nan if val == 9 else val for val in df_cols_imput_cat['borrower_62+']]
+    df_cols_imput_cat.loc[:, 'application_channel'] = [np.nan if val == 9 else val for val in df_cols_imput_cat['application_channel']]
+    df_cols_imput_cat.loc[:, 'AUS_name'] = [np.nan if (val == 6) | (val == 9) else val for val in df_cols_imput_cat['AUS_name']]
+    df_cols_imput_cat.loc[:, 'dti_cat'] = [np.nan if val == 99 else val for val in df_cols_imput_cat['dti_cat']]
+    # mode values for categorical columns which need imputation
+    mode_vals_cat = df_cols_imput_cat.mode()
+    # replace NAs with mode values in each categorical columns
+    df_cols_imputed_cat = df_cols_imput_cat.fillna({k: v[0] for k, v in mode_vals_cat.to_dict().items()})
+
+    df_clean = pd.concat([df_clean[cols_wt_missing_vals], df_cols_imputed_num,
+                                    df_cols_imputed_cat], axis=1)
+
+    df_clean[cols_fips] = df_clean[cols_fips].apply(lambda x: x.astype('int'))
+
+    return df_clean
@@ -0,0 +1,161 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import synthetic_pudb
+
+# Benchmark suite for the county averages pipeline on synthetic data (synthetic_pudb.py).
+#
+# For each size it times, and measures the peak memory of, every stage on one Census
+# Tract archive:
+#   parse       get_data's parsing with the default pd.read_csv parser
+#   parse_fast  the same with PUDB_PARSER=fast
+#   clean       clean_df on the parsed frame
+#   aggregate   get_county_averages on the cleaned frame
+#
+# Each (stage, size) runs in a fresh process so measurements don't affect each other.
+# Time is the best of --repeat runs; peak memory is the most memory allocated at once
+# during one more run, traced with tracemalloc (numpy and pandas arrays included) plus
+# pyarrow's memory pool. Results are written to benchmarks/results/<commit>.json, and
+# --compare prints the change against the results of an earlier commit.
+#
+# usage: python benchmarks/run_benchmarks.py --sizes 100000 1000000
+#        python benchmarks/run_benchmarks.py --compare benchmarks/results/<commit>.json
+
+STAGES = ["parse", "parse_fast", "clean", "aggregate"]
+DATASET = "Singlefamily-Census-Freddie"
+YEAR = 2022
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def git_commit():
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=repo)
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+                                cwd=repo)
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit.stdout.strip(), bool(status.stdout.strip())
+
+
+def prepare(stage, archive):
+    # everything a stage needs before the measured call, and the call itself
+    from fhfa_pudb.cleaning import clean_df
+    from fhfa_pudb import pipeline, sources
+
+    if stage in ("parse", "parse_fast"):
+        sources.PARSER_ENGINE = "fast" if stage == "parse_fast" else "pandas"
+        return lambda: sources.parse_archive(DATASET, YEAR, archive)
+    raw = sources.parse_archive(DATASET, YEAR, archive)
+    if stage == "clean":
+        return lambda: clean_df(raw, YEAR)
+    cleaned = clean_df(raw, YEAR)
+    return lambda: pipeline.get_county_averages(cleaned)
+
+
+def measure(stage, archive, repeat):
+    run = prepare(stage, archive)
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+
+    # pyarrow allocates outside of tracemalloc; its pool only tracks an all time peak, which
+    # is why every measurement gets its own process
+    arrow_pool = sys.modules["pyarrow"].default_memory_pool() if "pyarrow" in sys.modules else None
+    arrow_before = arrow_pool.max_memory() if arrow_pool else 0
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    arrow_peak = arrow_pool.max_memory() - arrow_before if arrow_pool else 0
+    return {"seconds": min(seconds), "peak_mb": (peak + arrow_peak) / 1e6}
+
+
+def run_isolated(stage, archive, repeat):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(measure, (stage, archive, repeat))
+
+
+def fixture(data_dir, rows, seed):
+    # generated archives are kept between runs, keyed by size and seed
+    out_dir = os.path.join(data_dir, f"{rows}_{seed}")
+    archive_name, _ = synthetic_pudb.ARCHIVES[DATASET]
+    path = os.path.join(out_dir, archive_name.format(year=YEAR))
+    if not os.path.exists(path):
+        print(f"generating {rows} rows...")
+        synthetic_pudb.write_archive(out_dir, DATASET, YEAR, rows, seed=seed)
+    return path
+
+
+def compare(results, baseline, threshold):
+    # returns the number of regressions: stages slower than threshold times the baseline
+    previous = {(r["stage"], r["rows"]): r for r in baseline["results"]}
+    print(f"\ncompared with {baseline['commit']}:")
+    regressions = 0
+    for r in results["results"]:
+        before = previous.get((r["stage"], r["rows"]))
+        if before is None:
+            continue
+        time_ratio = r["seconds"] / before["seconds"]
+        memory_ratio = r["peak_mb"] / before["peak_mb"] if before["peak_mb"] else 1.0
+        flag = ""
+        if time_ratio > threshold or memory_ratio > threshold:
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"{r['stage']:>10} {r['rows']:>10}: time {time_ratio:6.2f}x, memory {memory_ratio:6.2f}x{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 500_000, 1_000_000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="results file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.1,
+                        help="slowdown or memory growth ratio reported as a regression by --compare")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": [],
+    }
+    for rows in args.sizes:
+        archive = fixture(args.data_dir, rows, args.seed)
+        for stage in args.stages:
+            result = run_isolated(stage, archive, args.repeat)
+            result.update(stage=stage, rows=rows, rows_per_second=rows / result["seconds"])
+            results["results"].append(result)
+            print(f"{stage:>10} {rows:>10}: {result['seconds']:8.3f}s {result['rows_per_second']:12,.0f} rows/s "
+                  f"{result['peak_mb']:9.1f} MB peak")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            sys.exit(1 if compare(results, json.load(f), args.threshold) else 0)
@@ -0,0 +1,252 @@
+import argparse
+import os
+import sys
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fhfa_pudb.pudb_schema import NATIONAL_A_COLNAMES, SINGLEFAMILY_CENSUS_COLNAMES
+
+# Synthetic Single-Family Census Tract and National File A data for tests and benchmarks.
+#
+# Files use the exact column layouts from fhfa_pudb/pudb_schema.py, codes drawn from the ranges
+# in the 2022 PUDB documentation with roughly realistic frequencies, and the same
+# sentinel values for missing data (about the share of missing values we saw in the
+# Freddie Mac 2022 file). Geography is consistent: every loan's county belongs to its
+# state and every tract to its county. Archives are zipped and named like the real
+# ones on fhfa.gov, so they can be served to get_data from a local HTTP server.
+#
+# usage: python benchmarks/synthetic_pudb.py --rows 1800000 --year 2022 --out fixtures/
+
+CHUNK_ROWS = 250_000
+
+# 50 states + DC, plus Puerto Rico and the Virgin Islands
+STATE_FIPS = np.array([1, 2, 4, 5, 6, 8, 9, 10, 11, 12, 13, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24, 25, 26, 27,
+                       28, 29, 30, 31, 32, 33, 34, 35, 36, 37, 38, 39, 40, 41, 42, 44, 45, 46, 47, 48, 49, 50,
+                       51, 53, 54, 55, 56, 72, 78])
+
+ARCHIVES = {
+    "Singlefamily-Census-Fannie": ("Single-Family_Census_Tract_File_/{year}_SFCensusTractFNM{year}.zip",
+                                   "fnma_sf{year}c_loans.txt"),
+    "Singlefamily-Census-Freddie": ("Single-Family_Census_Tract_File_/{year}_SFCensusTractFRE{year}.zip",
+                                    "fhlmc_sf{year}c_loans.txt"),
+    "Singlefamily-National-A-Fannie": ("National-File-A/{year}_SFNationalFileA{year}.zip",
+                                       "fnma_sf{year}a_loans.txt"),
+    "Singlefamily-National-A-Freddie": ("National-File-A/{year}_SFNationalFileA{year}.zip",
+                                        "fhlmc_sf{year}a_loans.txt"),
+}
+
+
+def choice(rng, n, codes, p):
+    return rng.choice(np.array(codes), n, p=np.array(p) / np.sum(p))
+
+
+def with_sentinel(rng, values, sentinel, rate):
+    return np.where(rng.random(len(values)) < rate, sentinel, values)
+
+
+class Geography:
+    """A fixed set of counties, tracts and MSAs per state so that loans cluster like real data."""
+
+    def __init__(self, seed=0):
+        rng = np.random.default_rng(seed)
+        # bigger states get more loans and more counties
+        self.state_weights = rng.pareto(1.2, len(STATE_FIPS)) + 0.05
+        self.state_weights[-2:] = 0.002 # territories
+        self.state_weights /= self.state_weights.sum()
+        self.counties = {}
+        for state in STATE_FIPS:
+            n = int(rng.integers(3, 160))
+            codes = np.arange(1, 2 * n, 2) # county FIPS codes are odd numbers
+            weights = rng.pareto(1.0, n) + 0.01
+            msas = np.where(rng.random(n) < 0.35, 99999, rng.integers(10180, 49740, n))
+            self.counties[state] = (codes, weights / weights.sum(), msas)
+
+    def sample(self, rng, n):
+        state = rng.choice(STATE_FIPS, n, p=self.state_weights)
+        county = np.zeros(n, dtype=np.int64)
+        msa = np.zeros(n, dtype=np.int64)
+        for code in np.unique(state):
+            rows = np.flatnonzero(state == code)
+            codes, weights, msas = self.counties[code]
+            picked = rng.choice(len(codes), len(rows), p=weights)
+            county[rows] = codes[picked]
+            msa[rows] = msas[picked]
+        # tracts are 6 digits; derive them from the county so each county has its own small set
+        tract = (county * 7919 + rng.integers(0, 40, n) * 100) % 990000 + 100
+        return state, county, msa, tract
+
+
+def census_tract_frame(n, seed=0, enterprise=2, first_record=1, geography=None):
+    """A DataFrame of `n` synthetic Census Tract loans with the SINGLEFAMILY_CENSUS_COLNAMES layout."""
+    rng = np.random.default_rng(seed)
+    geography = geography or Geography()
+    state, county, msa, tract = geography.sample(rng, n)
+
+    upb = np.round(rng.lognormal(12.6, 0.5, n), -3).clip(20000, 2000000).astype(np.int64)
+    ltv = np.round(choice(rng, n, [80.0, 95.0, 97.0, 90.0, 0.0], [30, 12, 8, 8, 42]), 2)
+    spread = ltv == 0
+    ltv[spread] = np.round(rng.uniform(15, 100, spread.sum()), 2)
+    property_value = (np.round(upb / ltv * 100, -4) + 5000).astype(np.int64)
+    local_income = np.round(rng.normal(90000, 20000, n), -2).clip(30000, 250000).astype(np.int64)
+    tract_ratio = np.round(rng.lognormal(0.1, 0.35, n), 3)
+    borrower_income = np.round(rng.lognormal(11.4, 0.6, n), -3).astype(np.int64)
+    dti_exact = rng.integers(36, 50, n)
+
+    columns = {
+        "enterprise_flag": np.full(n, enterprise),
+        "record_num": np.arange(first_record, first_record + n),
+        "state_fips_code": state,
+        "msa_code": with_sentinel(rng, msa, 0, 0.0005),
+        "county_fips_code": with_sentinel(rng, county, 0, 0.0005),
+        "census_tract": with_sentinel(rng, tract, 0, 0.001),
+        "tract_pct_minority": with_sentinel(rng, np.round(rng.beta(1.2, 3, n) * 100, 2), 9999.0, 0.001),
+        "tract_median_income": with_sentinel(rng, np.round(local_income * tract_ratio, 0).astype(np.int64), 999999, 0.001),
+        "local_median_income": with_sentinel(rng, local_income, 999999, 0.0005),
+        "tract_income_ratio": with_sentinel(rng, tract_ratio, 9999.0, 0.001),
+        "borrower_income": borrower_income,
+        "local_median_family_income": with_sentinel(rng, local_income, 999999, 0.0005),
+        "borrower_income_ratio": with_sentinel(rng, np.round(borrower_income / local_income, 3), 9999.0, 0.01),
+        "upb": upb,
+        "purpose": choice(rng, n, [1, 2, 4], [60, 25, 15]),
+        "federal_guarantee": choice(rng, n, [1, 2, 3, 4], [1, 1, 1, 97]),
+        "num_borrowers": choice(rng, n, [1, 2, 3, 4, 99], [55, 43, 1.5, 0.4, 0.1]),
+        "first_time_buyer": choice(rng, n, [1, 2, 9], [30, 69.5, 0.5]),
+        "borrower_race_1": choice(rng, n, [1, 2, 3, 4, 5, 6, 7, 9], [1, 6, 7, 1, 65, 12, 6, 2]),
+        "borrower_race_2": choice(rng, n, [1, 2, 3, 4, 5, 6, 7, 9], [1, 1, 1, 1, 2, 1, 90, 3]),
+        "borrower_race_3": choice(rng, n, [5, 6, 7, 9], [1, 1, 95, 3]),
+        "borrower_race_4": choice(rng, n, [5, 6, 7, 9], [1, 1, 95, 3]),
+        "borrower_race": choice(rng, n, [1, 2, 3, 4, 5, 6, 7], [1, 6, 7, 1, 65, 12, 8]),
+        "borrower_ethnicity": choice(rng, n, [1, 2, 3, 4, 9], [10, 75, 12, 1, 2]),
+        "co-borrower_race_1": choice(rng, n, [1, 2, 3, 4, 5, 6, 7, 8, 9], [1, 3, 4, 1, 32, 5, 3, 50, 1]),
+        "co-borrower_race_2": choice(rng, n, [5, 6, 7, 8, 9], [1, 1, 45, 50, 3]),
+        "co-borrower_race_3": choice(rng, n, [5, 6, 7, 8, 9], [1, 1, 45, 50, 3]),
+        "co-borrower_race_4": choice(rng, n, [5, 6, 7, 8, 9], [1, 1, 45, 50, 3]),
+        "co-borrower_race": choice(rng, n, [1, 2, 3, 4, 5, 6, 7, 8], [1, 3, 4, 1, 32, 5, 4, 50]),
+        "co-borrower_ethnicity": choice(rng, n, [1, 2, 3, 4, 5, 9], [5, 37, 6, 1, 50, 1]),
+        "borrower_gender": choice(rng, n, [1, 2, 3, 4, 9], [55, 33, 10, 1, 1]),
+        "co-borrower_gender": choice(rng, n, [1, 2, 3, 4, 5, 9], [12, 32, 5, 1, 49, 1]),
+        "borrower_age": choice(rng, n, [1, 2, 3, 4, 5, 6, 7, 9], [5, 30, 25, 18, 12, 6, 3, 1]),
+        "co-borrower_age": choice(rng, n, [1, 2, 3, 4, 5, 6, 7, 8, 9], [3, 14, 12, 9, 6, 3, 2, 50, 1]),
+        "occupancy_code": choice(rng, n, [1, 2, 3], [90, 4, 6]),
+        "rate_spread": np.where(rng.random(n) < 0.9, 0, np.round(rng.uniform(-1, 3, n), 3)),
+        "HOEPA_status": choice(rng, n, [1, 2], [0.01, 99.99]),
+        "property_type": choice(rng, n, [1, 2], [98, 2]),
+        "lien_status": np.full(n, 1),
+        "borrower_62+": choice(rng, n, [1, 2, 9], [12, 87, 1]),
+        "co-borrower_62+": choice(rng, n, [1, 2, 3, 9], [5, 45, 49, 1]),
+        "ltv": with_sentinel(rng, ltv, 999.0, 0.0005),
+        "date_of_note": choice(rng, n, [1, 2, 3], [80, 18, 2]),
+        "term_at_orig": choice(rng, n, [360, 180, 240, 120, 300, 999], [75, 15, 5, 3, 1.9, 0.1]),
+        "num_units": choice(rng, n, [1, 2, 3, 4], [97, 2, 0.5, 0.5]),
+        "rate_at_orig": with_sentinel(rng, np.round(rng.normal(5.2, 1.1, n).clip(1.5, 10), 3), 99.0, 0.001),
+        "note_amount": with_sentinel(rng, upb, 999999999, 0.0005),
+        "preapproval": choice(rng, n, [1, 2, 3], [2, 58, 40]),
+        "application_channel": choice(rng, n, [1, 2, 3, 9], [45, 35, 19, 1]),
+        "AUS_name": choice(rng, n, [1, 2, 3, 4, 5, 6, 9], [55, 38, 1, 1, 1, 3, 1]),
+        "borrower_credit_model": choice(rng, n, [1, 2, 3, 4, 9, 99], [85, 5, 4, 2, 3, 1]),
+        "co-borrower_credit_model": choice(rng, n, [1, 2, 3, 4, 9, 10, 99], [40, 3, 2, 1, 2, 51, 1]),
+        "dti": np.where(rng.random(n) < 0.5, choice(rng, n, [10, 20, 30, 50, 99], [10, 25, 40, 24, 1]), dti_exact),
+        "discount_points": with_sentinel(rng, np.where(rng.random(n) < 0.6, 0, np.round(rng.uniform(0, 8000, n), 2)),
+                                         999999, 0.1),
+        "intro_rate_period": choice(rng, n, [999, 60, 84, 120], [96, 2, 1, 1]),
+        "land_property_interest": choice(rng, n, [1, 2, 5, 9], [99, 0.5, 0.4, 0.1]),
+        "property_value": with_sentinel(rng, property_value, 999999999, 0.0005),
+        "rural_tract": choice(rng, n, [1, 2], [10, 90]),
+        "mississippi_delta_county": choice(rng, n, [1, 2], [2, 98]),
+        "mid_appalachia_county": choice(rng, n, [1, 2], [3, 97]),
+        "persistent_poverty_county": choice(rng, n, [1, 2], [4, 96]),
+        "area_concentrated_poverty": choice(rng, n, [1, 2], [5, 95]),
+        "high_opportunity_area": choice(rng, n, [1, 2], [30, 70]),
+        "qualified_opportunity_zone_tract": choice(rng, n, [1, 2], [8, 92]),
+    }
+    return pd.DataFrame({name: columns[name] for name in SINGLEFAMILY_CENSUS_COLNAMES})
+
+
+def national_a_frame(n, seed=0, enterprise=2, first_record=1):
+    """A DataFrame of `n` synthetic National File A loans (coded values only)."""
+    rng = np.random.default_rng(seed)
+    columns = {
+        "enterprise_flag": np.full(n, enterprise),
+        "record_num": np.arange(first_record, first_record + n),
+        "msa_code": choice(rng, n, [0, 1], [12, 88]),
+        "tract_pct_minority": choice(rng, n, [1, 2, 3, 4, 9], [40, 30, 18, 11, 1]),
+        "tract_income_ratio": choice(rng, n, [1, 2, 3, 9], [15, 45, 39, 1]),
+        "borrower_income_ratio": choice(rng, n, [1, 2, 3, 9], [20, 30, 49, 1]),
+        "ltv": choice(rng, n, [1, 2, 3, 4, 9], [35, 25, 25, 14, 1]),
+        "purpose": choice(rng, n, [1, 2, 4], [60, 25, 15]),
+        "federal_guarantee": choice(rng, n, [1, 2, 3, 4], [1, 1, 1, 97]),
+        "borrower_race": choice(rng, n, [1, 2, 3, 4, 5, 6, 7], [1, 6, 7, 1, 65, 12, 8]),
+        "co-borrower_race": choice(rng, n, [1, 2, 3, 4, 5, 6, 7, 8], [1, 3, 4, 1, 32, 5, 4, 50]),
+        "borrower_gender": choice(rng, n, [1, 2, 3, 4, 9], [55, 33, 10, 1, 1]),
+        "co-borrower_gender": choice(rng, n, [1, 2, 3, 4, 5, 9], [12, 32, 5, 1, 49, 1]),
+        "num_units": choice(rng, n, [1, 2, 3, 4], [97, 2, 0.5, 0.5]),
+        "affordability": choice(rng, n, [0, 1, 2, 3, 4], [40, 25, 20, 10, 5]),
+    }
+    return pd.DataFrame({name: columns[name] for name in NATIONAL_A_COLNAMES})
+
+
+def write_loans(fileobj, frames, trailing_empty=False):
+    # single space separated like the FHFA files; with trailing_empty the last field is left
+    # out of every row, as qualified_opportunity_zone_tract is in the 2022 Census Tract files
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as csv
+    except ImportError:
+        csv = None
+    for frame in frames:
+        if trailing_empty:
+            frame = frame.iloc[:, :-1]
+        if csv is not None:
+            # about 8x faster than to_csv, which dominates the time to generate a file
+            options = csv.WriteOptions(include_header=False, delimiter=" ", quoting_style="none")
+            csv.write_csv(pa.Table.from_pandas(frame, preserve_index=False), fileobj, options)
+        else:
+            fileobj.write(frame.to_csv(sep=" ", header=False, index=False, lineterminator="\n").encode("ascii"))
+
+
+def write_archive(out_dir, dataset, year, rows, seed=0, trailing_empty=None):
+    """Write a synthetic archive for `dataset` under `out_dir` at the same relative path as on fhfa.gov.
+
+    National File A archives hold both enterprises' files, like the real ones.
+    Returns the archive path.
+    """
+    archive_name, _ = ARCHIVES[dataset]
+    path = os.path.join(out_dir, archive_name.format(year=year))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    census = "Census" in dataset
+    if trailing_empty is None:
+        trailing_empty = census and year >= 2022
+    datasets = [dataset] if census else [d for d in ARCHIVES if ARCHIVES[d][0] == archive_name]
+
+    # the fastest deflate level; the real archives are smaller but that only matters for download time
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for i, name in enumerate(datasets):
+            enterprise = 1 if name.endswith("Fannie") else 2
+            member = ARCHIVES[name][1].format(year=year)
+            with archive.open(member, "w", force_zip64=True) as f:
+                frames = (census_tract_frame(min(CHUNK_ROWS, rows - start), seed=(seed, i, start), enterprise=enterprise,
+                                             first_record=start + 1) if census else
+                          national_a_frame(min(CHUNK_ROWS, rows - start), seed=(seed, i, start), enterprise=enterprise,
+                                           first_record=start + 1)
+                          for start in range(0, rows, CHUNK_ROWS))
+                write_loans(f, frames, trailing_empty=trailing_empty and census)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--year", type=int, nargs="+", default=[2022])
+    parser.add_argument("--datasets", nargs="+", default=list(ARCHIVES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="fixtures")
+    args = parser.parse_args()
+
+    for year in args.year:
+        for dataset in args.datasets:
+            path = write_archive(args.out, dataset, year, args.rows, seed=(args.seed, year))
+            print(f"{dataset} {year}: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
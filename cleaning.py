@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/cleaning.py. Importing cleaning still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import cleaning
+
+sys.modules[__name__] = cleaning
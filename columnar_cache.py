@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/columnar_cache.py. Importing columnar_cache still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import columnar_cache
+
+sys.modules[__name__] = columnar_cache
@@ -0,0 +1,243 @@
+import json
+import os
+import tempfile
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from fhfa_pudb.archive_cache import default_cache
+
+# Model explanations (permutation importance and SHAP values) with an on-disk cache.
+#
+# permutation_importances() evaluates the features in parallel with joblib. The
+# feature matrix and target are memory mapped and shared read-only by the workers,
+# which never copy the full matrix: each permuted feature is scored in row batches,
+# replacing one column of a batch sized copy at a time.
+#
+# shap_values() runs TreeSHAP (or the linear explainer for linear models) against a
+# background sample drawn stratified by the target, explaining the rows in batches so
+# only one batch of SHAP values is being computed at a time. It needs the optional
+# shap package.
+#
+# Results are stored in <cache dir>/explanations/ under a key made of the model's
+# fingerprint (a hash of the fitted model), the data's fingerprint and the
+# parameters, so re-running a notebook or re-drawing a plot reads them back without
+# evaluating the model at all.
+
+DEFAULT_BATCH_SIZE = 50_000
+DEFAULT_BACKGROUND_SIZE = 200
+
+# scoring name: (metric, prediction method); higher is better for all of them
+SCORINGS = {
+    "accuracy": ("accuracy_score", "predict"),
+    "roc_auc": ("roc_auc_score", "predict_proba"),
+    "r2": ("r2_score", "predict"),
+    "neg_mean_squared_error": ("mean_squared_error", "predict"),
+}
+
+
+def fingerprint(*objects):
+    # joblib hashes numpy arrays and DataFrames by content, and fitted models by their learned state
+    import joblib
+    return joblib.hash(objects, hash_name="sha1")
+
+
+class ExplanationCache:
+    """Explanation results as .npz files keyed by a fingerprint of the model, data and parameters."""
+
+    def __init__(self, directory=None):
+        self.directory = directory or os.path.join(default_cache().cache_dir, "explanations")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, f"{kind}_{key}.npz")
+
+    def load(self, kind, key):
+        try:
+            with np.load(self._path(kind, key), allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def save(self, kind, key, arrays):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self._path(kind, key))
+
+
+def resolve_scoring(model, scoring):
+    from sklearn import metrics
+    from sklearn.base import is_classifier
+
+    if scoring is None:
+        scoring = "accuracy" if is_classifier(model) else "r2"
+    if scoring not in SCORINGS:
+        raise ValueError(f"unknown scoring {scoring!r}, expected one of {list(SCORINGS)}")
+    metric, method = SCORINGS[scoring]
+    sign = -1 if scoring.startswith("neg_") else 1
+    return scoring, getattr(metrics, metric), method, sign
+
+
+def predict_batches(model, method, X, batch_size, column=None, values=None):
+    # predictions for all rows, with feature `column` replaced by `values` if given
+    outputs = []
+    with warnings.catch_warnings():
+        # models fitted on a DataFrame warn about getting an array
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        for start in range(0, len(X), batch_size):
+            batch = X[start:start + batch_size]
+            if column is not None:
+                batch = np.array(batch) # the shared matrix is read-only
+                batch[:, column] = values[start:start + batch_size]
+            output = getattr(model, method)(batch)
+            outputs.append(output[:, 1] if method == "predict_proba" else output)
+    return np.concatenate(outputs)
+
+
+def feature_matrix(X, encode=True):
+    # the matrix the model sees: a DataFrame is encoded as training.train encodes its input, with
+    # categorical columns as their category codes (encode=False keeps every column's values,
+    # for models fitted on the numeric frame itself, like train_baseline's). The codes are numbered
+    # over the values in X, so a frame missing some categories should be encoded beforehand with
+    # encode_ordinal over the whole frame train() got, and passed as the matrix
+    if not isinstance(X, pd.DataFrame):
+        return np.asarray(X)
+    if encode:
+        from training import encode_ordinal
+        return encode_ordinal(X, list(X.columns), dtype=np.float64)[0]
+    return X.to_numpy(dtype=np.float64)
+
+
+def score_feature(model, X, y, column, n_repeats, seed, metric, method, sign, batch_size, baseline):
+    # runs in a joblib worker: X and y are read-only memory maps shared with the other workers
+    rng = np.random.default_rng(seed)
+    drops = np.empty(n_repeats)
+    for repeat in range(n_repeats):
+        permuted = X[rng.permutation(len(X)), column]
+        drops[repeat] = baseline - sign * metric(y, predict_batches(model, method, X, batch_size, column, permuted))
+    return drops
+
+
+def permutation_importances(model, X, y, feature_names=None, n_repeats=5, scoring=None, n_jobs=None,
+                            random_state=42, max_samples=None, batch_size=DEFAULT_BATCH_SIZE, cache=None,
+                            encode=True):
+    """Permutation importance of every feature: the drop in score when its values are shuffled.
+
+    Returns a DataFrame with the mean (Importance) and standard deviation of the drop
+    per feature, most important first, like the feature-importance frames in the notebooks. X can be a
+    DataFrame, encoded like training.train's input (see feature_matrix), or an array;
+    `max_samples` scores a random subset of the rows. Pass cache=False to skip the cache.
+    """
+    from joblib import Parallel, delayed
+
+    if feature_names is None:
+        feature_names = list(X.columns) if isinstance(X, pd.DataFrame) else [f"x{i}" for i in range(X.shape[1])]
+    X = np.ascontiguousarray(feature_matrix(X, encode))
+    y = np.asarray(y)
+    scoring, metric, method, sign = resolve_scoring(model, scoring)
+    if max_samples is not None and max_samples < len(X):
+        rows = np.sort(np.random.default_rng(random_state).choice(len(X), max_samples, replace=False))
+        X, y = X[rows], y[rows]
+
+    cache = ExplanationCache() if cache is None else cache
+    params = {"n_repeats": n_repeats, "scoring": scoring, "random_state": random_state, "features": list(feature_names)}
+    key = fingerprint(model, X, y, json.dumps(params))
+    if cache:
+        cached = cache.load("permutation", key)
+        if cached is not None:
+            return importance_frame(feature_names, cached["importances"])
+
+    baseline = sign * metric(y, predict_batches(model, method, X, batch_size))
+    seeds = np.random.SeedSequence(random_state).spawn(X.shape[1]) # the same results for any n_jobs
+    importances = Parallel(n_jobs=n_jobs, max_nbytes="1M", mmap_mode="r")(
+        delayed(score_feature)(model, X, y, column, n_repeats, seeds[column], metric, method, sign, batch_size, baseline)
+        for column in range(X.shape[1]))
+    importances = np.vstack(importances)
+    if cache:
+        cache.save("permutation", key, {"importances": importances})
+    return importance_frame(feature_names, importances)
+
+
+def importance_frame(feature_names, importances):
+    return pd.DataFrame({
+        "Feature": feature_names,
+        "Importance": importances.mean(axis=1),
+        "importance_std": importances.std(axis=1),
+    }).sort_values(by="Importance", ascending=False, ignore_index=True)
+
+
+def stratified_sample(X, labels, n, random_state=42):
+    """Row positions of a sample of `n` rows with the same share of each label as the whole."""
+    from sklearn.model_selection import train_test_split
+
+    rows = np.arange(len(X))
+    if n >= len(rows):
+        return rows
+    try:
+        sample, _ = train_test_split(rows, train_size=n, stratify=labels, random_state=random_state)
+    except ValueError:
+        # a stratum with a single row, or more strata than rows in the sample
+        sample, _ = train_test_split(rows, train_size=n, random_state=random_state)
+    return np.sort(sample)
+
+
+def _import_shap():
+    try:
+        import shap
+    except ImportError as e:
+        raise ImportError("SHAP values need the shap package: pip install shap") from e
+    return shap
+
+
+def shap_values(model, X, strata=None, background_size=DEFAULT_BACKGROUND_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                random_state=42, cache=None, encode=True):
+    """SHAP values of every row of X (rows x features; classes last for multi-output models) and the expected value.
+
+    The background data is a sample of `background_size` rows of X stratified by
+    `strata` (e.g. the target, or a state column). Tree models use TreeSHAP, linear
+    models the linear explainer. A DataFrame X is encoded like training.train's input
+    (see feature_matrix). Pass cache=False to skip the cache.
+    """
+    names = list(X.columns) if isinstance(X, pd.DataFrame) else None
+    values = feature_matrix(X, encode)
+    strata = np.zeros(len(values)) if strata is None else np.asarray(strata)
+    background = values[stratified_sample(values, strata, background_size, random_state)]
+
+    cache = ExplanationCache() if cache is None else cache
+    key = fingerprint(model, values, background, json.dumps({"features": names}))
+    if cache:
+        cached = cache.load("shap", key)
+        if cached is not None:
+            return cached["values"], cached["expected_value"]
+
+    shap = _import_shap()
+    if hasattr(model, "coef_"):
+        explainer = shap.LinearExplainer(model, background)
+    else:
+        explainer = shap.TreeExplainer(model, data=background, feature_perturbation="interventional")
+    batches = []
+    for start in range(0, len(values), batch_size):
+        batch = explainer.shap_values(values[start:start + batch_size])
+        # older shap versions return one array per class
+        batches.append(np.stack(batch, axis=-1) if isinstance(batch, list) else np.asarray(batch))
+    result = np.concatenate(batches)
+    expected_value = np.asarray(explainer.expected_value, dtype=np.float64)
+    if cache:
+        cache.save("shap", key, {"values": result, "expected_value": expected_value})
+    return result, expected_value
+
+
+def plot_importances(importances, top=10, title="Top 10 Most Important Features"):
+    """The notebooks' horizontal bar chart of the `top` most important features."""
+    import matplotlib.pyplot as plt
+
+    top_features = importances.sort_values(by="Importance", ascending=False).head(top)
+    plt.figure(figsize=(10, 6))
+    plt.barh(top_features["Feature"], top_features["Importance"], color="skyblue")
+    plt.xlabel("Importance")
+    plt.ylabel("Feature")
+    plt.title(title)
+    plt.gca().invert_yaxis()
+    plt.show()
@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/fast_parser.py. Importing fast_parser still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import fast_parser
+
+sys.modules[__name__] = fast_parser
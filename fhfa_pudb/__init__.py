@@ -0,0 +1,43 @@
+# Reading, cleaning and aggregating the FHFA Public Use Database (PUDB) loan files.
+# (Not named pudb, which is the PuDB debugger's package on PyPI.)
+#
+#     import fhfa_pudb
+#     df = fhfa_pudb.get_data("Singlefamily-Census-Freddie", 2022)
+#
+# Importing the package is cheap and does no I/O: the names below are loaded from
+# their modules (and pandas imported) on first use. The command line is
+# `python -m fhfa_pudb`, see fhfa_pudb/cli.py. The package is self-contained: the
+# modules it builds on (ingest, fast_parser, cleaning, scanner, ...) are in it and import
+# each other relatively; the top-level modules of the same names only re-export them.
+
+# name: module it is defined in
+_EXPORTS = {
+    "get_url": "fhfa_pudb.sources",
+    "get_filename": "fhfa_pudb.sources",
+    "get_parser": "fhfa_pudb.sources",
+    "get_data": "fhfa_pudb.sources",
+    "get_data_chunks": "fhfa_pudb.sources",
+    "get_columns": "fhfa_pudb.sources",
+    "get_sample": "fhfa_pudb.sources",
+    "scan": "fhfa_pudb.sources",
+    "CENSUS_DATASETS": "fhfa_pudb.sources",
+    "get_county_averages": "fhfa_pudb.pipeline",
+    "fetch": "fhfa_pudb.pipeline",
+    "clean": "fhfa_pudb.pipeline",
+    "aggregate": "fhfa_pudb.pipeline",
+    "read_cleaned": "fhfa_pudb.pipeline",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'fhfa_pudb' has no attribute {name!r}")
+    import importlib
+
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
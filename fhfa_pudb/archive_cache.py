@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+# Local on-disk cache for the FHFA PUDB zip archives.
+#
+# Archives are stored content-addressed (blobs/<sha256>.zip) and an index maps
+# each (dataset, year, url) key to a blob plus the validators the server sent
+# (ETag / Last-Modified). A cached archive is revalidated with a conditional GET,
+# so an unchanged archive costs one 304 round trip instead of a full download.
+#
+# Configuration through environment variables:
+#   PUDB_CACHE_DIR        where to keep the archives (default ~/.cache/pudb)
+#   PUDB_CACHE_MAX_BYTES  total size cap, least recently used archives are evicted first; archives
+#                         an ArchiveCache has returned are not evicted by it, so the cap can be
+#                         exceeded while a run is using them
+#   PUDB_OFFLINE          if set to 1, never touch the network and only serve cached archives
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pudb")
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3 # 20 GB, a bit more than all Census Tract and National archives for 2018-2022
+CHUNK_SIZE = 1024 * 1024
+
+
+def cache_key(dataset, year, url):
+    return hashlib.sha256(f"{dataset}|{year}|{url}".encode("utf-8")).hexdigest()
+
+
+class ArchiveCache:
+    def __init__(self, cache_dir=None, max_bytes=None, offline=None, timeout=60):
+        self.cache_dir = cache_dir or os.environ.get("PUDB_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.environ.get("PUDB_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.max_bytes = max_bytes
+        if offline is None:
+            offline = os.environ.get("PUDB_OFFLINE", "0").lower() in ("1", "true", "yes")
+        self.offline = offline
+        self.timeout = timeout
+        self.blob_dir = os.path.join(self.cache_dir, "blobs")
+        self.index_path = os.path.join(self.cache_dir, "index.json")
+        self._lock = threading.Lock()
+        self._in_use = set() # blobs this cache returned, which its own evictions leave alone
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    def fetch(self, dataset, year, url):
+        """Return the local path of the archive at `url`, downloading it only if it changed."""
+        return self.fetch_status(dataset, year, url)[0]
+
+    def fetch_status(self, dataset, year, url):
+        """Same as fetch, but returns (path, bytes downloaded); 0 bytes if the cached copy was used."""
+        key = cache_key(dataset, year, url)
+        with self._lock:
+            entry = self._load_index().get(key)
+        if entry is not None and not os.path.exists(self._blob_path(entry["sha256"])):
+            entry = None
+
+        if self.offline:
+            if entry is None:
+                raise FileNotFoundError(f"{dataset} {year} is not cached and offline mode is enabled ({url})")
+            return self._touch(key, entry), 0
+
+        request = Request(url)
+        if entry is not None:
+            if entry.get("etag"):
+                request.add_header("If-None-Match", entry["etag"])
+            if entry.get("last_modified"):
+                request.add_header("If-Modified-Since", entry["last_modified"])
+
+        try:
+            resp = urlopen(request, timeout=self.timeout)
+        except HTTPError as e:
+            if e.code == 304 and entry is not None:
+                return self._touch(key, entry), 0
+            raise
+        except URLError as e:
+            # serve a stale copy rather than failing the whole run when fhfa.gov is unreachable
+            if entry is not None:
+                print(f"warning: could not revalidate {url} ({e.reason}), using cached copy")
+                return self._touch(key, entry), 0
+            raise
+
+        with resp:
+            if resp.status == 304 and entry is not None:
+                return self._touch(key, entry), 0
+            sha256, size = self._store(resp)
+
+        entry = {
+            "dataset": dataset,
+            "year": year,
+            "url": url,
+            "sha256": sha256,
+            "size": size,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        }
+        path = self._touch(key, entry)
+        if size > self.max_bytes:
+            print(f"warning: {url} ({size} bytes) is larger than the cache size cap of {self.max_bytes} bytes")
+        self.evict()
+        return path, size
+
+    def cached_path(self, dataset, year, url):
+        """Return the local path of a cached archive without revalidating it, or None."""
+        with self._lock:
+            entry = self._load_index().get(cache_key(dataset, year, url))
+        if entry is None or not os.path.exists(self._blob_path(entry["sha256"])):
+            return None
+        return self._blob_path(entry["sha256"])
+
+    def evict(self, max_bytes=None, keep=None):
+        """Delete least recently used archives until the cache fits in `max_bytes`.
+
+        Archives in `keep` (sha256 digests; by default every archive this cache has
+        returned) are never deleted, even if the cache doesn't fit without deleting them.
+        Files in blobs/ that no index entry points at are deleted as well.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            keep = self._in_use if keep is None else keep
+            index = self._load_index()
+            # several keys can point at the same blob (e.g. National File A is shared by both enterprises)
+            blobs = {}
+            for entry in index.values():
+                blob = blobs.setdefault(entry["sha256"], {"size": entry["size"], "last_used": 0})
+                blob["last_used"] = max(blob["last_used"], entry.get("last_used", 0))
+            total = sum(blob["size"] for blob in blobs.values())
+            evicted = []
+            for sha256, blob in sorted(blobs.items(), key=lambda kv: kv[1]["last_used"]):
+                if total <= max_bytes:
+                    break
+                if sha256 in keep:
+                    continue
+                total -= blob["size"]
+                evicted.append(sha256)
+                try:
+                    os.remove(self._blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+            if evicted:
+                index = {k: v for k, v in index.items() if v["sha256"] not in evicted}
+                self._write_index(index)
+            # blobs no index entry points at (e.g. left behind by an older version of this cache)
+            orphans = [name[:-len(".zip")] for name in os.listdir(self.blob_dir)
+                       if name.endswith(".zip") and name[:-len(".zip")] not in blobs]
+            self._remove_unreferenced(index, orphans, keep)
+        return evicted
+
+    def clear(self):
+        self.evict(max_bytes=0, keep=())
+
+    def _blob_path(self, sha256):
+        return os.path.join(self.blob_dir, f"{sha256}.zip")
+
+    def _store(self, resp):
+        # stream the body to a temp file in the cache dir, then rename it into place so
+        # readers never see a partially written archive
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=self.blob_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, self._blob_path(digest.hexdigest()))
+            with self._lock:
+                # not in the index until _touch, so keep evict() from taking it for an orphan
+                self._in_use.add(digest.hexdigest())
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest.hexdigest(), size
+
+    def _touch(self, key, entry):
+        with self._lock:
+            index = self._load_index()
+            entry = dict(entry, last_used=time.time())
+            previous = index.get(key)
+            index[key] = entry
+            self._write_index(index)
+            self._in_use.add(entry["sha256"])
+            # the archive changed upstream: delete the old copy unless something still uses it
+            if previous is not None and previous["sha256"] != entry["sha256"]:
+                self._remove_unreferenced(index, [previous["sha256"]], self._in_use)
+        return self._blob_path(entry["sha256"])
+
+    def _remove_unreferenced(self, index, sha256s, keep):
+        referenced = {entry["sha256"] for entry in index.values()}
+        for sha256 in sha256s:
+            if sha256 not in referenced and sha256 not in keep:
+                try:
+                    os.remove(self._blob_path(sha256))
+                except FileNotFoundError:
+                    pass
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_index(self, index):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".json.part")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+
+_default_cache = None
+
+def default_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ArchiveCache()
+    return _default_cache
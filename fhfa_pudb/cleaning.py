@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+# Schema driven cleaning of the Single-Family Census Tract loan files (based on code by Ning Xia).
+#
+# Each cleaning schema lists, for every column kept in the cleaned frame:
+#   - the sentinel codes that mean "missing / not applicable" in the PUDB documentation
+#   - how missing values are imputed: "median", "mode" or None
+#   - the output dtype: "category", "int", or None to keep the parsed dtype
+# Columns that are not listed are dropped. Sentinels are replaced with vectorized
+# masks and each output column is built exactly once, so cleaning a year is a single
+# pass over the data with no intermediate copies of the whole frame.
+#
+# The PUDB layout and codes change over time, so schemas are versioned by the first
+# data year they apply to. Add a new entry to CLEANING_SCHEMAS when a new year's
+# documentation changes a code, rather than editing an existing schema.
+
+DTI_LABELS = ['<= 35%', '> 35%']
+
+def dti_to_label(dti):
+    # dti is coded as 10 (< 20%), 20 (20% - < 30%), 30 (30% - < 36%), the exact ratio for 36% - 49%,
+    # 50 (50% - 60%) and 99 (missing); anything else has no label
+    dti = np.asarray(dti)
+    codes = np.full(len(dti), -1, dtype=np.int8)
+    codes[np.isin(dti, [10, 20, 30])] = 0
+    codes[(dti >= 36) & (dti <= 98)] = 1
+    return pd.Categorical.from_codes(codes, DTI_LABELS).remove_unused_categories()
+
+CLEANING_SCHEMA_2018 = {
+    "version": 1,
+    # output column: (sentinel codes, imputation, dtype)
+    "columns": {
+        # columns without missing values
+        "state_fips_code": ((), None, "int"),
+        "borrower_income": ((), None, None),
+        "upb": ((), None, None),
+        "purpose": ((), None, "category"),
+        "federal_guarantee": ((), None, "category"),
+        "num_borrowers": ((), None, "category"),
+        "occupancy_code": ((), None, "category"),
+        "property_type": ((), None, "category"),
+        "date_of_note": ((), None, "category"),
+        "term_at_orig": ((), None, "category"),
+        "num_units": ((), None, "category"),
+        "rural_tract": ((), None, "category"),
+        "mississippi_delta_county": ((), None, "category"),
+        "mid_appalachia_county": ((), None, "category"),
+        "persistent_poverty_county": ((), None, "category"),
+        "area_concentrated_poverty": ((), None, "category"),
+        "high_opportunity_area": ((), None, "category"),
+        # numerical columns with <= 5% missing values: median imputation
+        "tract_pct_minority": ((9999.0,), "median", None),
+        "tract_median_income": ((999999,), "median", None),
+        "local_median_income": ((999999,), "median", None),
+        "tract_income_ratio": ((9999.0,), "median", None),
+        "local_median_family_income": ((999999,), "median", None),
+        "borrower_income_ratio": ((9999.0,), "median", None),
+        "ltv": ((999.0,), "median", None),
+        "rate_at_orig": ((99.0,), "median", None),
+        "note_amount": ((999999999,), "median", None),
+        "property_value": ((999999999,), "median", None),
+        "dti_num": ((99,), "median", None),
+        # categorical columns with <= 5% missing values: mode imputation
+        "msa_code": ((0,), "mode", "category"),
+        "county_fips_code": ((0,), "mode", "int"),
+        "census_tract": ((0,), "mode", "category"),
+        "first_time_buyer": ((9,), "mode", None),
+        "borrower_age": ((9,), "mode", "category"),
+        "borrower_62+": ((9,), "mode", "category"),
+        "application_channel": ((9,), "mode", "category"),
+        "AUS_name": ((6, 9), "mode", "category"),
+        "dti_cat": ((), "mode", "category"),
+    },
+    # output columns computed from another column: output column -> (source column, transform)
+    "derived": {
+        "dti_num": ("dti", None),
+        "dti_cat": ("dti", dti_to_label),
+    },
+}
+
+# first data year each schema applies to
+CLEANING_SCHEMAS = {
+    2018: CLEANING_SCHEMA_2018,
+}
+
+
+def get_cleaning_schema(year=None):
+    """Return the cleaning schema for data `year` (the most recent schema if None)."""
+    first_years = sorted(CLEANING_SCHEMAS)
+    if year is None:
+        return CLEANING_SCHEMAS[first_years[-1]]
+    applicable = [y for y in first_years if y <= year]
+    if not applicable:
+        print(f"warning: the cleaning rules have not been checked against {year} data, using the {first_years[0]} rules")
+        return CLEANING_SCHEMAS[first_years[0]]
+    return CLEANING_SCHEMAS[applicable[-1]]
+
+
+def clean_df(df, year=None):
+    """Drop unused columns, replace sentinel codes and impute missing values using the schema for `year`."""
+    schema = get_cleaning_schema(year)
+    columns = {}
+    for name, (sentinels, impute, dtype) in schema["columns"].items():
+        source, transform = schema["derived"].get(name, (name, None))
+        values = df[source]
+        if transform is not None:
+            values = transform(values)
+        columns[name] = clean_column(values, sentinels, impute, dtype)
+    return pd.DataFrame(columns, index=df.index, copy=False)
+
+
+def clean_column(values, sentinels=(), impute=None, dtype=None):
+    if dtype == "category":
+        return clean_categorical(values, sentinels, impute)
+
+    values = np.asarray(values)
+    missing = None
+    if sentinels:
+        is_sentinel = np.isin(values, sentinels)
+        if is_sentinel.any():
+            values = values.astype(values.dtype if values.dtype.kind == "f" else np.float64)
+            values[is_sentinel] = np.nan
+    if values.dtype.kind == "f":
+        missing = np.isnan(values)
+    if impute is not None and missing is not None and missing.any():
+        present = values[~missing]
+        if impute == "median":
+            fill = np.median(present)
+        else:
+            # smallest of the most common values, like pandas' mode()
+            uniques, counts = np.unique(present, return_counts=True)
+            fill = uniques[counts.argmax()]
+        values = np.where(missing, fill, values)
+    if dtype == "int":
+        values = values.astype("int")
+    return values
+
+
+def clean_categorical(values, sentinels=(), impute=None):
+    if not isinstance(values, pd.Categorical):
+        values = pd.Categorical(values)
+    codes = original_codes = values.codes
+    if sentinels:
+        sentinel_codes = values.categories.get_indexer(list(sentinels))
+        sentinel_codes = sentinel_codes[sentinel_codes >= 0]
+        if len(sentinel_codes):
+            codes = np.where(np.isin(codes, sentinel_codes), -1, codes).astype(codes.dtype)
+    if impute == "mode":
+        missing = codes == -1
+        if missing.any():
+            # categories are sorted, so argmax picks the smallest of the most common values like pandas' mode()
+            counts = np.bincount(codes[~missing], minlength=len(values.categories))
+            codes = np.where(missing, counts.argmax(), codes).astype(codes.dtype)
+    elif impute == "median":
+        raise ValueError("median imputation is not supported for categorical columns")
+    if codes is original_codes:
+        return values
+    return pd.Categorical.from_codes(codes, dtype=values.dtype)
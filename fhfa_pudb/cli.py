@@ -0,0 +1,121 @@
+import argparse
+import sys
+
+from .sources import CENSUS_DATASETS, get_url
+
+# Command line for the data pipeline:
+#
+#   python -m fhfa_pudb fetch --years 2018-2022                download the archives into the cache
+#   python -m fhfa_pudb clean --years 2022 --output cleaned/   write cleaned_<year>.parquet files
+#   python -m fhfa_pudb clean --years 2022 --sample 0.01 --stratify county   a 1% sample, cleaned
+#   python -m fhfa_pudb aggregate --years 2018-2022            write county_averages_by_year.csv
+#
+# Every command takes --datasets (the Census Tract files of both enterprises by
+# default), --jobs and --dry-run, which lists the archives that would be used, whether
+# they are already cached, and what would be written, without downloading anything.
+# pandas and the rest of the pipeline are only imported once a command runs.
+
+DEFAULT_YEARS = "2018-2022"
+
+
+def parse_years(values):
+    # "2018-2022", "2018 2020" or a mix of both
+    years = []
+    for value in values:
+        for part in value.split(","):
+            first, _, last = part.partition("-")
+            years.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(years))
+
+
+def dry_run(args, writes):
+    from .archive_cache import default_cache
+
+    cache = default_cache()
+    for year in args.years:
+        for dataset in args.datasets:
+            url = get_url(dataset, year)
+            status = "cached" if cache.cached_path(dataset, year, url) else "not cached"
+            print(f"{dataset} {year}: {url} ({status})")
+    for path in writes:
+        print(f"would write {path}")
+
+
+def fetch(args):
+    if args.dry_run:
+        return dry_run(args, [])
+    from .pipeline import fetch
+
+    for (dataset, year), path in fetch(args.years, args.datasets, jobs=args.jobs).items():
+        print(f"{dataset} {year}: {path}")
+
+
+def clean(args):
+    from .pipeline import cleaned_path
+
+    if args.dry_run:
+        return dry_run(args, [cleaned_path(args.output, year, args.sample) for year in args.years])
+    from .pipeline import clean
+
+    for path in clean(args.years, args.datasets, output_dir=args.output, jobs=args.jobs, sample=args.sample,
+                      stratify=args.stratify, seed=args.seed):
+        print(f"wrote {path}")
+
+
+def aggregate(args):
+    if args.dry_run:
+        return dry_run(args, [args.output])
+    import pandas as pd
+
+    from .pipeline import aggregate
+
+    pd.set_option('display.max_columns', None)
+    pd.set_option('display.max_rows', None)
+    aggregate(args.years, args.datasets, output=args.output, jobs=args.jobs, streaming=args.streaming or None,
+              join=args.join)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="fhfa_pudb",
+                                     description="Download, clean and aggregate FHFA PUDB loan files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--years", nargs="+", default=[DEFAULT_YEARS],
+                        help=f"years or ranges of years, e.g. 2022 or 2018-2022 (default {DEFAULT_YEARS})")
+    common.add_argument("--datasets", nargs="+", default=CENSUS_DATASETS, help="default: %(default)s")
+    common.add_argument("--jobs", type=int, default=None,
+                        help="downloads at once for fetch, worker processes otherwise (default: all cores)")
+    common.add_argument("--dry-run", action="store_true", help="only list what would be downloaded and written")
+
+    command = commands.add_parser("fetch", parents=[common], help="download the archives into the cache")
+    command.set_defaults(run=fetch)
+
+    command = commands.add_parser("clean", parents=[common], help="write each year's cleaned loans as Parquet")
+    command.add_argument("--output", default=".", help="directory for the cleaned_<year>.parquet files")
+    command.add_argument("--sample", type=float, default=None,
+                         help="only keep this fraction of the loans, e.g. 0.01, sampled while the files are read")
+    command.add_argument("--stratify", default=None,
+                         help="sample each state, county, dti_cat (or value of another column) in proportion")
+    command.add_argument("--seed", type=int, default=42, help="seed of the sample (default %(default)s)")
+    command.set_defaults(run=clean)
+
+    command = commands.add_parser("aggregate", parents=[common], help="write the county averages of every year")
+    command.add_argument("--output", default="county_averages_by_year.csv")
+    command.add_argument("--streaming", action="store_true",
+                         help="aggregate in chunks with flat memory (default: PUDB_STREAMING)")
+    command.add_argument("--join", choices=["inner", "outer"], default=None,
+                         help="keep only counties present in every year, or all of them (default: PUDB_JOIN or inner)")
+    command.set_defaults(run=aggregate)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.years = parse_years(args.years)
+    args.run(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import os
+import tempfile
+
+from .archive_cache import default_cache
+from .ingest import DEFAULT_CHUNKSIZE, open_archive_member
+from .pudb_schema import SCHEMA_VERSION, get_schema
+
+# Columnar (Parquet) cache of parsed loan files.
+#
+# The first time a (dataset, year) is requested, its loan file is parsed in chunks
+# and written to parsed/<dataset>_<year>_<archive sha256>_v<SCHEMA_VERSION>.parquet
+# next to the archive cache, using the compact dtypes from pudb_schema.py (one row
+# group per chunk). A column with values that don't fit its compact dtype is widened
+# (to int64 or float64) and the file written again. Later loads only read the
+# requested columns from that file.
+# The file name contains the archive hash and schema version, so a new archive
+# from fhfa.gov or a schema change produces a fresh file instead of a stale one.
+#
+# Requires pyarrow (pip install pyarrow).
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("the columnar cache requires pyarrow: pip install pyarrow") from e
+    return pa, pq
+
+
+def parsed_path(cache, dataset, year, archive):
+    sha256 = os.path.splitext(os.path.basename(archive))[0]
+    return os.path.join(cache.cache_dir, "parsed", f"{dataset}_{year}_{sha256[:16]}_v{SCHEMA_VERSION}.parquet")
+
+
+def load_columns(dataset, year, url, member, parser, columns=None, cache=None):
+    """Return `columns` (all if None) of a parsed loan file with compact dtypes, parsing it at most once."""
+    cache = cache or default_cache()
+    archive = cache.fetch(dataset, year, url)
+    path = parsed_path(cache, dataset, year, archive)
+    if not os.path.exists(path):
+        write_parsed(path, archive, member, parser, dataset, year)
+    return read_parsed(path, columns=columns)
+
+
+def read_parsed(path, columns=None):
+    _, pq = _import_pyarrow()
+    table = pq.read_table(path, columns=columns, memory_map=True)
+    # split_blocks avoids consolidating columns into 2D blocks, so most columns are converted without a copy
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def write_parsed(path, archive, member, parser, dataset, year=None, chunksize=DEFAULT_CHUNKSIZE):
+    pa, pq = _import_pyarrow()
+    _, dtypes = get_schema(dataset, year)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(widened):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".parquet.part")
+        os.close(fd)
+        writer = None
+        try:
+            with open_archive_member(archive, member) as fileobj:
+                with parser(fileobj, chunksize=chunksize) as reader:
+                    for chunk in reader:
+                        if writer is None:
+                            schema = arrow_schema(chunk, dtypes, widened)
+                            writer = pq.ParquetWriter(tmp_path, schema)
+                        writer.write_table(chunk_table(chunk, schema))
+            if writer is None:
+                raise ValueError(f"{member} in {archive} is empty")
+            writer.close()
+            writer = None
+            os.replace(tmp_path, path)
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    write_widening(write, f"{dataset} {year}")
+
+
+class ColumnsDontFit(Exception):
+    """A chunk has values that don't fit the types of some columns; `widened` maps them to types that fit."""
+
+    def __init__(self, widened):
+        super().__init__(", ".join(f"{name} needs {type_}" for name, type_ in widened.items()))
+        self.widened = widened
+
+
+def write_widening(write, description):
+    # write(widened) parses a file and writes it with the types of its layout, except for the
+    # columns in widened; if a chunk doesn't fit, the file is written again from the start with
+    # those columns widened, so whether a file can be cached doesn't depend on where its first
+    # large value is. Columns only ever get wider, so this ends after a few rewrites at most.
+    widened = {}
+    while True:
+        try:
+            return write(widened)
+        except ColumnsDontFit as e:
+            if all(widened.get(name) == type_ for name, type_ in e.widened.items()):
+                raise ValueError(f"{description} does not fit the column types even after widening ({e})") from e
+            print(f"warning: {description}: values don't fit the layout's types ({e}), writing it again")
+            widened.update(e.widened)
+
+
+def chunk_table(chunk, schema):
+    pa, _ = _import_pyarrow()
+    try:
+        return pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        pass
+    widened = {}
+    for field in schema:
+        try:
+            pa.array(chunk[field.name], type=field.type, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+            widened[field.name] = wider_type(chunk[field.name])
+    raise ColumnsDontFit(widened)
+
+
+def wider_type(values):
+    pa, _ = _import_pyarrow()
+    inferred = pa.array(values, from_pandas=True).type
+    if pa.types.is_integer(inferred):
+        return pa.int64()
+    if pa.types.is_floating(inferred):
+        return pa.float64()
+    return inferred
+
+
+def arrow_schema(chunk, dtypes, widened=None):
+    # the compact dtype of each column from the layout, except for the columns in `widened`
+    # ({name: arrow type}) that have held larger values; columns without a layout dtype get the
+    # type pandas inferred for them
+    pa, _ = _import_pyarrow()
+    widened = widened or {}
+    fields = []
+    for name in chunk.columns:
+        if name in widened:
+            type_ = widened[name]
+        elif name in dtypes:
+            type_ = pa.from_numpy_dtype(dtypes[name])
+        else:
+            type_ = pa.array(chunk[name], from_pandas=True).type
+            if pa.types.is_null(type_):
+                # an all-empty column
+                type_ = pa.float64()
+        fields.append(pa.field(name, type_))
+    return pa.schema(fields)
@@ -0,0 +1,238 @@
+import io
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from .pudb_schema import OPTIONAL_TRAILING_COLUMNS
+
+# Fast parser for the whitespace delimited PUDB loan files.
+#
+# The loan files are purely numeric with a fixed number of fields per row, so they
+# don't need pandas' general purpose regex-delimited reader. Two engines decode them
+# straight into typed column arrays:
+#   - "arrow": pyarrow's multi-threaded CSV reader with an explicit column schema,
+#     used when fields are separated by single spaces (the layout of the FHFA files)
+#   - "pandas": pd.read_csv's C reader with the same column types, used when pyarrow
+#     is missing or the fields are separated by other whitespace
+# Every line is checked before it reaches the arrow engine: from the first line that
+# isn't single space delimited on, the rest of the file is read by the pandas engine.
+#
+# Every row must have one field per column of the layout. Only the fields in
+# pudb_schema.OPTIONAL_TRAILING_COLUMNS (e.g. qualified_opportunity_zone_tract, which
+# the 2022 files leave out) may be missing from the end of the rows; those columns are
+# filled with NaN, like pd.read_csv(names=...) does.
+#
+# By default integer fields come out as int64 and decimal fields as float64, the same
+# as pd.read_csv; compact=True uses the small dtypes from pudb_schema.py instead.
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024 # small blocks stay in CPU cache and parse faster than large ones
+BYTES_PER_ROW = 256 # rough size of a Census Tract row, used to turn a chunk size in rows into bytes
+
+
+class PrefixedReader(io.RawIOBase):
+    # re-attaches bytes already read from the start of a stream
+    def __init__(self, prefix, fileobj):
+        self.prefix = prefix
+        self.fileobj = fileobj
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.prefix:
+            n = min(len(buffer), len(self.prefix))
+            buffer[:n] = self.prefix[:n]
+            self.prefix = self.prefix[n:]
+            return n
+        data = self.fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class SingleSpacedLines(io.RawIOBase):
+    # passes the whole lines of a stream through up to the first one that isn't single space
+    # delimited, and then ends; `rest` holds the bytes read from that line on (None until then)
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.ready = memoryview(b"")
+        self.partial = b"" # the incomplete last line read so far
+        self.eof = False
+        self.rest = None
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.ready and self.rest is None and not self.eof:
+            self._fill(len(buffer))
+        n = min(len(buffer), len(self.ready))
+        buffer[:n] = self.ready[:n]
+        self.ready = self.ready[n:]
+        return n
+
+    def _fill(self, size):
+        data = self.fileobj.read(max(size, 64 * 1024))
+        if not data:
+            lines, self.partial, self.eof = self.partial, b"", True
+        else:
+            data = self.partial + data
+            end = data.rfind(b"\n") + 1
+            lines, self.partial = data[:end], data[end:]
+        start = _first_irregular_line(lines)
+        if start is not None:
+            self.rest = lines[start:] + self.partial
+            lines = lines[:start]
+        self.ready = memoryview(lines)
+
+
+def _first_irregular_line(lines):
+    # offset of the first line with a space at its start or end, after another space, or with a tab
+    # (or None): vectorized, as substring searches for two spaces are slow on space delimited text
+    codes = np.frombuffer(lines, dtype=np.uint8)
+    space = codes == ord(" ")
+    end = codes == ord("\n")
+    if b"\r" in lines:
+        end |= codes == ord("\r")
+    after = space[1:] & (space[:-1] | end[:-1]) # two spaces, or a space starting a line
+    before = space[:-1] & end[1:] # a space ending a line
+    # the first and last bytes start and end lines (the last one only at the end of the file)
+    if not (after.any() or before.any() or space[:1].any() or space[-1:].any() or b"\t" in lines):
+        return None
+    bad = codes == ord("\t")
+    bad[1:] |= after
+    bad[:-1] |= before
+    bad[:1] |= space[:1]
+    bad[-1:] |= space[-1:]
+    return lines.rfind(b"\n", 0, int(bad.argmax())) + 1
+
+
+def column_types(colnames, dtypes, compact=False):
+    types = {}
+    for name in colnames:
+        dtype = np.dtype(dtypes.get(name, "float64"))
+        if not compact:
+            dtype = np.dtype("int64") if dtype.kind == "i" else np.dtype("float64")
+        types[name] = dtype
+    return types
+
+
+def read_loans(fileobj, colnames, dtypes, chunksize=None, usecols=None, compact=False, engine=None):
+    """Parse a loan file into a DataFrame, or with `chunksize` into an iterator of DataFrames.
+
+    The iterator is returned wrapped in contextlib.closing, so it can be used with
+    `with` like the reader pd.read_csv returns.
+    """
+    head = fileobj.readline()
+    fileobj = io.BufferedReader(PrefixedReader(head, fileobj), buffer_size=1024 * 1024)
+    nfields = len(head.split())
+    required = required_fields(colnames)
+    if not required <= nfields <= len(colnames):
+        expected = str(required) if required == len(colnames) else f"{required} to {len(colnames)}"
+        raise ValueError(f"rows have {nfields} fields, but the layout has {expected}")
+
+    if engine is None:
+        engine = "arrow" if _has_pyarrow() and _single_space_delimited(head) else "pandas"
+    types = column_types(colnames, dtypes, compact)
+    usecols = list(colnames) if usecols is None else [name for name in colnames if name in set(usecols)]
+    block_size = DEFAULT_BLOCK_SIZE if chunksize is None else max(chunksize * BYTES_PER_ROW, 1024 * 1024)
+
+    if engine == "arrow":
+        chunks = _iter_arrow_then_pandas(fileobj, colnames[:nfields], types, usecols, block_size, chunksize)
+    else:
+        chunks = _iter_pandas(fileobj, colnames[:nfields], types, usecols, chunksize)
+    chunks = (_add_missing_columns(chunk, usecols) for chunk in chunks)
+
+    if chunksize is not None:
+        return closing(chunks)
+    frames = list(chunks)
+    if not frames:
+        return pd.DataFrame({name: pd.Series(dtype=types[name]) for name in usecols})
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+def required_fields(colnames):
+    # the number of leading columns every row must have
+    n = len(colnames)
+    while n and colnames[n - 1] in OPTIONAL_TRAILING_COLUMNS:
+        n -= 1
+    return n
+
+
+def _has_pyarrow():
+    try:
+        import pyarrow.csv # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _single_space_delimited(line):
+    line = line.rstrip(b"\r\n")
+    return bool(line) and not line.startswith(b" ") and not line.endswith(b" ") \
+        and b"  " not in line and b"\t" not in line
+
+
+def _add_missing_columns(chunk, usecols):
+    # fields missing from the end of every row, as NaN
+    for name in usecols:
+        if name not in chunk:
+            chunk[name] = np.full(len(chunk), np.nan)
+    return chunk[usecols]
+
+
+def _iter_arrow_then_pandas(fileobj, names, types, usecols, block_size, chunksize):
+    # the arrow engine reads the lines up to the first one that isn't single space delimited,
+    # and the pandas engine the rest (if any)
+    lines = SingleSpacedLines(fileobj)
+    regular = io.BufferedReader(lines, buffer_size=1024 * 1024)
+    if regular.peek(1):
+        yield from _iter_arrow(regular, names, types, usecols, block_size, streaming=chunksize is not None)
+    if lines.rest is not None:
+        rest = io.BufferedReader(PrefixedReader(lines.rest, fileobj), buffer_size=1024 * 1024)
+        yield from _iter_pandas(rest, names, types, usecols, chunksize)
+
+
+def _iter_arrow(fileobj, names, types, usecols, block_size, streaming=True):
+    import pyarrow as pa
+    import pyarrow.csv as csv
+
+    read_options = csv.ReadOptions(column_names=names, block_size=block_size, use_threads=True)
+    parse_options = csv.ParseOptions(delimiter=" ")
+    convert_options = csv.ConvertOptions(
+        column_types={name: pa.from_numpy_dtype(types[name]) for name in names},
+        include_columns=[name for name in usecols if name in names])
+    try:
+        if not streaming:
+            # one table converted at once avoids concatenating many small frames
+            yield csv.read_csv(fileobj, read_options=read_options, parse_options=parse_options,
+                               convert_options=convert_options).to_pandas()
+            return
+        reader = csv.open_csv(fileobj, read_options=read_options, parse_options=parse_options,
+                              convert_options=convert_options)
+        for batch in reader:
+            yield batch.to_pandas()
+    except pa.ArrowInvalid as e:
+        raise ValueError(f"loan file does not match the expected layout of {len(names)} fields: {e}") from e
+
+
+def _iter_pandas(fileobj, names, types, usecols, chunksize):
+    # pandas' C reader. It raises on rows with too many fields, but fills rows that stop early with
+    # NaN, which whitespace delimited files can't otherwise have, so every column is read (usecols
+    # would also turn off the first check) and the last one is checked. Letting pandas infer the
+    # types and casting afterwards is faster than passing dtype=
+    reader = pd.read_csv(fileobj, names=names, sep=r"\s+", header=None, chunksize=chunksize)
+    row = 0
+    try:
+        for chunk in ([reader] if chunksize is None else reader):
+            short = chunk[names[-1]].isna().to_numpy()
+            if short.any():
+                raise ValueError(f"row {row + short.argmax()} has fewer than {len(names)} fields")
+            row += len(chunk)
+            columns = [name for name in names if name in set(usecols)]
+            yield chunk[columns].astype({name: types[name] for name in columns}, copy=False)
+    finally:
+        if chunksize is not None:
+            reader.close()
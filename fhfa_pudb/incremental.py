@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+import pandas as pd
+
+from .archive_cache import default_cache
+from .cleaning import get_cleaning_schema
+
+# Persisted per-year results, so a run only recomputes the years whose inputs changed.
+#
+# Each year's county aggregates are stored as aggregates/<name>_<year>.csv in the
+# cache directory, next to a .json file holding the fingerprint of the inputs that
+# produced them: the sha256 of every source archive, the version of the cleaning
+# schema for that year, and the name (and `version` attribute, if it has one) of the
+# function that computed them. When the fingerprint of a year matches, the stored
+# result is reused as is.
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def archive_digest(archive):
+    # archives from the archive cache are already named by their sha256
+    name = os.path.splitext(os.path.basename(archive))[0]
+    if SHA256_RE.match(name):
+        return name
+    digest = hashlib.sha256()
+    with open(archive, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def year_fingerprint(year, archives, process_name, process_version=None):
+    inputs = {
+        "year": year,
+        "archives": {dataset: archive_digest(archive) for dataset, archive in sorted(archives.items())},
+        "cleaning_schema": get_cleaning_schema(year)["version"],
+        "process": process_name,
+    }
+    if process_version is not None:
+        inputs["process_version"] = process_version
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class YearStore:
+    def __init__(self, directory=None, name="county_averages"):
+        self.directory = directory or os.path.join(default_cache().cache_dir, "aggregates")
+        self.name = name
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _paths(self, year):
+        base = os.path.join(self.directory, f"{self.name}_{year}")
+        return base + ".csv", base + ".json"
+
+    def load(self, year, fingerprint):
+        csv_path, meta_path = self._paths(year)
+        try:
+            with open(meta_path) as f:
+                if json.load(f)["fingerprint"] != fingerprint:
+                    return None
+            return pd.read_csv(csv_path, index_col="county", dtype={"county": str})
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return None
+
+    def save(self, year, df, fingerprint):
+        csv_path, meta_path = self._paths(year)
+        # drop the old fingerprint first and write it last, so a crash never leaves a fingerprint
+        # pointing at data it does not describe
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for path, write in [(csv_path, lambda f: df.to_csv(f)),
+                            (meta_path, lambda f: json.dump({"year": year, "fingerprint": fingerprint}, f))]:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+            with os.fdopen(fd, "w", newline="") as f:
+                write(f)
+            os.replace(tmp_path, path)
+
+
+def process_year_cached(year, archives, process, store=None):
+    """Return process(year, archives), reusing the stored result if its inputs have not changed."""
+    store = store or YearStore()
+    fingerprint = year_fingerprint(year, archives, process.__name__, getattr(process, "version", None))
+    result = store.load(year, fingerprint)
+    if result is not None:
+        print(f'{year}: inputs unchanged, reusing stored result')
+        return result
+    result = process(year, archives)
+    store.save(year, result, fingerprint)
+    return result
+
+
+def assemble_wide(yearly_data, join="inner"):
+    """Combine per-year frames (indexed by county) side by side in one concat.
+
+    join="inner" keeps only counties present in every year, join="outer" keeps all of
+    them and leaves the missing years empty.
+    """
+    frames = [yearly_data[year] for year in sorted(yearly_data)]
+    wide = pd.concat(frames, axis=1, join=join).sort_index()
+    # counties missing from a year turn integer columns into floats; keep them integers
+    int_columns = [name for frame in frames for name, dtype in frame.dtypes.items() if dtype.kind == "i"]
+    return wide.astype({name: "Int64" for name in int_columns if wide[name].dtype.kind == "f"})
@@ -0,0 +1,56 @@
+import shutil
+import tempfile
+from contextlib import contextmanager
+from urllib.request import urlopen
+from zipfile import ZipFile
+
+from .archive_cache import CHUNK_SIZE, default_cache
+
+# Streaming access to the loan files inside the PUDB archives.
+#
+# The archive is never read into memory: it is either served from the on-disk
+# archive cache or, when caching is turned off, streamed into a spooled temp file
+# that rolls over to disk once it gets large. The member file is then decompressed
+# incrementally by ZipFile and handed to a parser, which can read it in chunks of
+# `chunksize` rows so peak memory depends on the chunk size and not on the file size.
+
+SPOOL_MAX_SIZE = 64 * 1024 * 1024 # keep small archives in memory, spill bigger ones to disk
+DEFAULT_CHUNKSIZE = 250_000 # rows; a 64 column Census Tract chunk is ~130 MB as int64/float64
+
+
+@contextmanager
+def open_member(dataset, year, url, member, cache=None):
+    """Yield a file object streaming `member` out of the archive at `url`.
+
+    `cache` is an ArchiveCache, None for the default cache, or False to download
+    into a temporary file that is deleted afterwards.
+    """
+    if cache is False:
+        archive = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        with urlopen(url) as resp:
+            shutil.copyfileobj(resp, archive, CHUNK_SIZE)
+        archive.seek(0)
+    else:
+        archive = (cache or default_cache()).fetch(dataset, year, url)
+
+    try:
+        with open_archive_member(archive, member) as fileobj:
+            yield fileobj
+    finally:
+        if cache is False:
+            archive.close()
+
+
+@contextmanager
+def open_archive_member(archive, member):
+    """Yield a file object streaming `member` out of a local archive (a path or seekable file)."""
+    with ZipFile(archive) as zipreader, zipreader.open(member) as fileobj:
+        yield fileobj
+
+
+def iter_chunks(dataset, year, url, member, parser, chunksize=DEFAULT_CHUNKSIZE, cache=None):
+    """Yield DataFrames of at most `chunksize` rows parsed from `member`."""
+    with open_member(dataset, year, url, member, cache=cache) as fileobj:
+        with parser(fileobj, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
@@ -0,0 +1,302 @@
+import csv
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Stage level timing and memory instrumentation of a pipeline run.
+#
+# Pipeline code wraps each stage in a `stage` block:
+#
+#     with stage("clean", dataset, year) as s:
+#         cleaned = clean_df(raw, year)
+#         s.record(rows=len(cleaned))
+#
+# Instrumentation is off unless PUDB_REPORT is set, in which case `stage` returns a
+# shared object that does nothing. When it is set to a path prefix, every stage (in
+# any process of the run) appends one record to <prefix>.jsonl with its wall time,
+# CPU time of the process, the highest RSS above the RSS at its start (sampled while
+# it runs, see RSSSampler) and any counts it recorded (rows, bytes). write_report() turns these into <prefix>.json, with
+# per-stage totals, and <prefix>.csv.
+#
+# PUDB_PROFILE=cprofile and/or tracemalloc (comma separated) additionally saves a
+# cProfile dump and the top memory allocations of each stage to <prefix>_profiles/.
+
+REPORT_FIELDS = ["stage", "dataset", "year", "wall_seconds", "cpu_seconds", "peak_rss_delta_mb", "rows", "bytes",
+                 "pid"]
+TRACEMALLOC_TOP = 25
+
+
+def enabled():
+    return bool(os.environ.get("PUDB_REPORT"))
+
+
+def enable(prefix, profile=()):
+    # through the environment, so worker processes started afterwards report too
+    os.environ["PUDB_REPORT"] = prefix
+    os.environ["PUDB_PROFILE"] = ",".join(profile)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak * 1024 / 1e6 # bytes on macOS, KiB elsewhere
+
+
+def current_rss_mb():
+    # Linux only; None elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RSSSampler:
+    """Context manager that samples the process's RSS in a background thread.
+
+    peak_delta_mb is the highest RSS seen above the RSS at the start, which unlike the
+    peak RSS of the process is not hidden by an earlier, higher peak. Where the current
+    RSS can't be read it falls back to the increase of the process's peak RSS.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak_delta_mb = None
+
+    def __enter__(self):
+        import threading
+
+        self.start = current_rss_mb()
+        self.start_peak = peak_rss_mb()
+        self.peak = self.start
+        self.stopped = threading.Event()
+        self.thread = None
+        if self.start is not None:
+            self.thread = threading.Thread(target=self._sample, daemon=True)
+            self.thread.start()
+        return self
+
+    def _sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.peak_delta_mb = max(self.peak, current_rss_mb()) - self.start
+        elif self.start_peak is not None:
+            self.peak_delta_mb = peak_rss_mb() - self.start_peak
+        return False
+
+
+class NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, **counts):
+        pass
+
+    def meter(self, fileobj):
+        return fileobj
+
+
+NULL_STAGE = NullStage()
+
+
+class MeteredReader:
+    """File wrapper that counts the bytes read and the time spent reading them (i.e. decompressing)."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def _timed(self, method, *args):
+        wall, cpu = time.perf_counter(), time.process_time()
+        data = method(*args)
+        self.wall += time.perf_counter() - wall
+        self.cpu += time.process_time() - cpu
+        return data
+
+    def read(self, *args):
+        data = self._timed(self.fileobj.read, *args)
+        self.bytes += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._timed(self.fileobj.readline, *args)
+        self.bytes += len(data)
+        return data
+
+    def readinto(self, buffer):
+        n = self._timed(self.fileobj.readinto, buffer)
+        self.bytes += n or 0
+        return n
+
+    def __iter__(self):
+        return iter(self.readline, b"")
+
+    def __getattr__(self, name):
+        return getattr(self.fileobj, name)
+
+
+class Stage:
+    def __init__(self, name, dataset, year, prefix, profile):
+        self.name = name
+        self.dataset = dataset
+        self.year = year
+        self.prefix = prefix
+        self.profile = profile
+        self.counts = {}
+        self.readers = []
+
+    def record(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + value
+
+    def meter(self, fileobj):
+        """Wrap a decompressing file object; time spent reading it is reported as a separate decompress stage."""
+        reader = MeteredReader(fileobj)
+        self.readers.append(reader)
+        return reader
+
+    def __enter__(self):
+        self.profiler = None
+        if "cprofile" in self.profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+        if "tracemalloc" in self.profile:
+            import tracemalloc
+            tracemalloc.start()
+        # measured per stage: the process's peak RSS would hide every stage after the largest one
+        self.memory = RSSSampler().__enter__()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        if self.profiler:
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler:
+            self.profiler.disable()
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        self.memory.__exit__(*exc)
+        peak_delta = self.memory.peak_delta_mb
+        if self.profile:
+            self._save_profiles()
+
+        records = []
+        if self.readers:
+            # reading the archive member is where it gets decompressed
+            read_wall = sum(reader.wall for reader in self.readers)
+            read_cpu = sum(reader.cpu for reader in self.readers)
+            records.append(self._record("decompress", read_wall, read_cpu, None,
+                                        {"bytes": sum(reader.bytes for reader in self.readers)}))
+            wall, cpu = wall - read_wall, cpu - read_cpu
+        records.append(self._record(self.name, wall, cpu, peak_delta, self.counts))
+        with open(self.prefix + ".jsonl", "a") as f:
+            # one write per stage, so records from concurrent processes don't interleave
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+        return False
+
+    def _record(self, name, wall, cpu, peak_delta, counts):
+        return {"stage": name, "dataset": self.dataset, "year": self.year, "wall_seconds": round(wall, 6),
+                "cpu_seconds": round(cpu, 6), "peak_rss_delta_mb": None if peak_delta is None else round(peak_delta, 3),
+                "rows": counts.get("rows"), "bytes": counts.get("bytes"), "pid": os.getpid()}
+
+    def _save_profiles(self):
+        directory = self.prefix + "_profiles"
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, "_".join(str(part) for part in [self.name, self.dataset, self.year, os.getpid()]
+                                                if part is not None))
+        if self.profiler:
+            self.profiler.dump_stats(base + ".prof")
+        if "tracemalloc" in self.profile:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                # a stage running at the same time in another thread stopped it first
+                return
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(base + "_tracemalloc.txt", "w") as f:
+                f.write(f"peak traced memory: {peak / 1e6:.1f} MB\n")
+                for stat in snapshot.statistics("lineno")[:TRACEMALLOC_TOP]:
+                    f.write(f"{stat}\n")
+
+
+def stage(name, dataset=None, year=None):
+    """Context manager that instruments one pipeline stage; does nothing unless PUDB_REPORT is set."""
+    prefix = os.environ.get("PUDB_REPORT")
+    if not prefix:
+        return NULL_STAGE
+    profile = {p.strip() for p in os.environ.get("PUDB_PROFILE", "").lower().split(",") if p.strip()}
+    return Stage(name, dataset, year, prefix, profile)
+
+
+def start_run():
+    # forget the records of a previous run with the same report prefix
+    prefix = os.environ.get("PUDB_REPORT")
+    if prefix:
+        os.makedirs(os.path.dirname(os.path.abspath(prefix)), exist_ok=True)
+        if os.path.exists(prefix + ".jsonl"):
+            os.remove(prefix + ".jsonl")
+    return time.time()
+
+
+def read_records(prefix):
+    try:
+        with open(prefix + ".jsonl") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def summarize(records):
+    # totals per stage, and throughput where rows were counted
+    summary = {}
+    for record in records:
+        totals = summary.setdefault(record["stage"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                      "rows": 0, "bytes": 0})
+        totals["count"] += 1
+        for key in ["wall_seconds", "cpu_seconds", "rows", "bytes"]:
+            totals[key] += record[key] or 0
+    for totals in summary.values():
+        totals["rows_per_second"] = totals["rows"] / totals["wall_seconds"] if totals["rows"] and totals["wall_seconds"] else None
+    return summary
+
+
+def write_report(started=None):
+    """Write <prefix>.json and <prefix>.csv from the stage records of the run; returns the JSON path."""
+    prefix = os.environ.get("PUDB_REPORT")
+    if not prefix:
+        return None
+    records = read_records(prefix)
+    report = {
+        "started": started,
+        "finished": time.time(),
+        "argv": sys.argv,
+        "peak_rss_mb": peak_rss_mb(),
+        "summary": summarize(records),
+        "stages": records,
+    }
+    with open(prefix + ".json", "w") as f:
+        json.dump(report, f, indent=2)
+    with open(prefix + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+    return prefix + ".json"
@@ -0,0 +1,198 @@
+import functools as ft
+import os
+
+import pandas as pd
+
+from .cleaning import clean_df, get_cleaning_schema
+from .incremental import assemble_wide, process_year_cached
+from .ingest import DEFAULT_CHUNKSIZE, open_archive_member
+from .instrumentation import stage, start_run, write_report
+from .sampling import StreamSampler
+from .scheduler import run_grid
+from .sources import CENSUS_DATASETS, fetch_archive, get_filename, get_parser, parse_archive
+from .streaming_agg import CountyAggregator, MAX_STATE_FIPS
+
+# The county averages pipeline (what calculate_county_averages.py runs) and the clean
+# step on its own, for the fhfa_pudb command line.
+#
+# Archives are downloaded in a thread pool and each year is parsed, cleaned and
+# aggregated in a worker process as soon as both enterprises' files are on disk (see
+# scheduler.py). At most MAX_YEARS_IN_MEMORY years are processed at once, since a year
+# of Census Tract data is several GB.
+
+DEFAULT_YEARS = range(2018, 2023) # 2018-2022
+DEFAULT_OUTPUT = "county_averages_by_year.csv"
+MAX_YEARS_IN_MEMORY = 2
+
+
+def get_county_averages(raw_df):
+    # group on the integer county key and only format the few thousand unique keys as strings
+    # (rollups.py computes the same means for tracts, MSAs and states too)
+    state = raw_df['state_fips_code'].to_numpy()
+    keep = state <= MAX_STATE_FIPS # exclude territories
+    county = (state * 1000 + raw_df['county_fips_code'].to_numpy())[keep]
+    groupby = raw_df[keep].groupby(county)
+
+    out = pd.DataFrame({
+        'dti_avg': groupby['dti_num'].mean().round(3),
+        'ltv_avg': groupby['ltv'].mean().round(3),
+        'income_estimate': groupby['tract_median_income'].mean().round(0).astype('int'), # not a good estimate
+        'pct_nonwhite_estimate': groupby['tract_pct_minority'].mean().round(3), # not a good estimate
+        'pct_first_time_buyer': groupby['first_time_buyer'].mean().mul(-100).add(200).round(3)
+    })
+    out.index = pd.Index(out.index.astype(str).str.zfill(5), name='county')
+
+    return out
+
+
+def sample_archives(year, archives, fraction, stratify=None, seed=42):
+    # one sampler over both enterprises' files, so every stratum is sampled across the whole year
+    sampler = StreamSampler(fraction, stratify=stratify, seed=seed)
+    for dataset, archive in archives.items():
+        with stage('parse_sample', dataset, year) as s:
+            with open_archive_member(archive, get_filename(dataset, year)) as fileobj:
+                with get_parser(dataset, year)(s.meter(fileobj), chunksize=DEFAULT_CHUNKSIZE) as reader:
+                    for chunk in reader:
+                        sampler.update(chunk)
+                        s.record(rows=len(chunk))
+    return sampler.result()
+
+
+def clean_year(year, archives, sample=None, stratify=None, seed=42):
+    # parse both enterprises' files for the year (or a `sample` fraction of their loans) and clean them
+    if sample:
+        raw_data = sample_archives(year, archives, sample, stratify, seed)
+    else:
+        raw_data = pd.concat([parse_archive(dataset, year, archive) for dataset, archive in archives.items()])
+    print(f'{year}: {raw_data.shape}')
+    with stage('clean', year=year) as s:
+        cleaned_data = clean_df(raw_data, year)
+        s.record(rows=len(cleaned_data))
+    return cleaned_data
+
+
+def process_year(year, archives):
+    # runs in a worker process: parse both enterprises' files for the year, clean them and aggregate by county
+    cleaned_data = clean_year(year, archives)
+    with stage('aggregate', year=year) as s:
+        county_averages = get_county_averages(cleaned_data)
+        s.record(rows=len(county_averages))
+    return add_year_suffix(county_averages, year)
+
+
+def process_year_streaming(year, archives):
+    # same result as process_year, but the files are read in chunks into mergeable per-county
+    # accumulators (counts of each value, so the medians used for imputation are exact), so memory
+    # stays flat regardless of file size
+    aggregator = CountyAggregator(year)
+    for dataset, archive in archives.items():
+        # parsing and aggregating are interleaved chunk by chunk, so they are timed as one stage
+        with stage('parse_aggregate', dataset, year) as s:
+            with open_archive_member(archive, get_filename(dataset, year)) as fileobj:
+                with get_parser(dataset, year)(s.meter(fileobj), chunksize=DEFAULT_CHUNKSIZE) as reader:
+                    for chunk in reader:
+                        aggregator.update(chunk)
+                        s.record(rows=len(chunk))
+    print(f'{year}: {aggregator.counts.sum()} loans')
+    return add_year_suffix(aggregator.result(), year)
+
+
+# stored streaming results of an older version are recomputed (see incremental.py); 2: exact medians
+process_year_streaming.version = 2
+
+
+def add_year_suffix(county_averages, year):
+    #cols_to_rename = ['dti_avg', 'income_estimate', 'pct_nonwhite_estimate', 'pct_first_time_buyer']
+    return county_averages.rename(columns=lambda x: f'{x}_{year}' if x != 'county' else x)
+
+
+def aggregate(years=DEFAULT_YEARS, datasets=CENSUS_DATASETS, output=DEFAULT_OUTPUT, jobs=None, streaming=None,
+              join=None):
+    """Compute the county averages of every year and write them side by side to `output`.
+
+    streaming and join default to the PUDB_STREAMING and PUDB_JOIN environment
+    variables. Returns the wide frame.
+    """
+    yearly_data = {}
+    started = start_run()
+
+    # streaming aggregates in chunks with flat memory instead of loading each year into memory
+    if streaming is None:
+        streaming = os.environ.get('PUDB_STREAMING', '0') == '1'
+    process = process_year_streaming if streaming else process_year
+
+    # years whose archives and cleaning rules have not changed since the last run are not recomputed
+    process = ft.partial(process_year_cached, process=process)
+    for year, county_averages in run_grid(years, datasets, fetch_archive, process, jobs=jobs,
+                                          max_in_flight=MAX_YEARS_IN_MEMORY):
+        print(county_averages.head(3))
+        yearly_data[year] = county_averages
+
+    # join="outer" keeps counties that are missing from some years (inner keeps only counties present in all years)
+    with stage('merge') as s:
+        df_final = assemble_wide(yearly_data, join=join or os.environ.get('PUDB_JOIN', 'inner'))
+        s.record(rows=len(df_final))
+    with stage('write') as s:
+        # written to a temporary file first, so readers (e.g. query_service.py) never see a partial file
+        df_final.to_csv(output + '.part')
+        os.replace(output + '.part', output)
+        s.record(rows=len(df_final), bytes=os.path.getsize(output))
+
+    # PUDB_REPORT=<path prefix> writes a timing and memory report of every stage to <prefix>.json and <prefix>.csv
+    report = write_report(started)
+    if report:
+        print(f'run report written to {report}')
+    return df_final
+
+
+def cleaned_path(output_dir, year, sample=None):
+    name = f'cleaned_{year}_sample{sample:g}' if sample else f'cleaned_{year}'
+    return os.path.join(output_dir, name + '.parquet')
+
+
+def write_cleaned_year(year, archives, output_dir, sample=None, stratify=None, seed=42):
+    # runs in a worker process, so only the path goes back to the parent
+    path = cleaned_path(output_dir, year, sample)
+    cleaned_data = clean_year(year, archives, sample, stratify, seed)
+    with stage('write', year=year):
+        cleaned_data.to_parquet(path + '.part', index=False)
+        os.replace(path + '.part', path)
+    return path
+
+
+def read_cleaned(path, year=None):
+    """Read a file written by clean(), with the categorical columns of the year's cleaning schema as categoricals."""
+    df = pd.read_parquet(path)
+    # Parquet only gives string categoricals back as categoricals; the coded ones come back as integers
+    columns = get_cleaning_schema(year)["columns"]
+    categorical = [name for name, (_, _, dtype) in columns.items() if dtype == "category" and name in df]
+    return df.astype({name: "category" for name in categorical})
+
+
+def clean(years=DEFAULT_YEARS, datasets=CENSUS_DATASETS, output_dir='.', jobs=None, sample=None, stratify=None,
+          seed=42):
+    """Clean every year's loans (both enterprises together) into <output_dir>/cleaned_<year>.parquet; returns the paths.
+
+    With `sample` (a fraction), only a seeded sample of each year's loans is kept,
+    stratified by `stratify` if given (see sampling.py), and cleaned into
+    cleaned_<year>_sample<fraction>.parquet. Read the files back with read_cleaned.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    process = ft.partial(write_cleaned_year, output_dir=output_dir, sample=sample, stratify=stratify, seed=seed)
+    return [path for _, path in run_grid(years, datasets, fetch_archive, process, jobs=jobs,
+                                         max_in_flight=MAX_YEARS_IN_MEMORY)]
+
+
+def fetch(years=DEFAULT_YEARS, datasets=CENSUS_DATASETS, jobs=None):
+    """Download (or revalidate) the archives of every dataset and year into the archive cache.
+
+    `jobs` is the number of downloads at once. Returns {(dataset, year): archive path}.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .scheduler import DEFAULT_DOWNLOAD_WORKERS, with_retries
+
+    archives = [(dataset, year) for year in years for dataset in datasets]
+    with ThreadPoolExecutor(jobs or DEFAULT_DOWNLOAD_WORKERS) as downloads:
+        paths = downloads.map(lambda archive: with_retries(fetch_archive, *archive), archives)
+        return dict(zip(archives, paths))
@@ -0,0 +1,216 @@
+# Column layouts and compact dtypes for the PUDB loan files.
+#
+# The dtype maps assign the smallest type that holds every documented value of a
+# field, including its "not applicable" sentinel codes (e.g. 9, 99, 999999999):
+# one byte for most coded fields, int16/int32 for codes and dollar amounts, and
+# float32 for the decimal fields. They are used when a parsed file is persisted to
+# the columnar cache (see columnar_cache.py).
+
+# bump this when a layout or dtype below changes, so cached parsed files are rebuilt
+SCHEMA_VERSION = 1
+
+# documentation: https://www.fhfa.gov/DataTools/Downloads/Documents/Enterprise-PUDB/Single-Family_Census_Tract_File_/2022_Single_Family_Census_Tract_File.pdf
+# note: check documentation for the specific year you are pulling data from. Not all columns are present for all years
+SINGLEFAMILY_CENSUS_COLNAMES = ["enterprise_flag",
+                                "record_num",
+                                "state_fips_code",
+                                "msa_code",
+                                "county_fips_code",
+                                "census_tract", # pre-2012: 2000 census data; 2012-2021: 2010 census data; 2022: 2020 census data
+                                "tract_pct_minority",
+                                "tract_median_income",
+                                "local_median_income",
+                                "tract_income_ratio",
+                                "borrower_income",
+                                "local_median_family_income",
+                                "borrower_income_ratio",
+                                "upb",
+                                "purpose",
+                                "federal_guarantee",
+                                "num_borrowers",
+                                "first_time_buyer",
+                                "borrower_race_1", # 5 columns for borrower race; first 4 seem mostly N/A
+                                "borrower_race_2", # TODO: is there a better way to parse these 5 cols?
+                                "borrower_race_3",
+                                "borrower_race_4",
+                                "borrower_race", # use this
+                                "borrower_ethnicity",
+                                "co-borrower_race_1", # 5 columns for co-borrower race; see above
+                                "co-borrower_race_2",
+                                "co-borrower_race_3",
+                                "co-borrower_race_4",
+                                "co-borrower_race",
+                                "co-borrower_ethnicity",
+                                "borrower_gender",
+                                "co-borrower_gender",
+                                "borrower_age",
+                                "co-borrower_age",
+                                "occupancy_code",
+                                "rate_spread",
+                                "HOEPA_status",
+                                "property_type",
+                                "lien_status",
+                                "borrower_62+",
+                                "co-borrower_62+",
+                                "ltv",
+                                "date_of_note",
+                                "term_at_orig",
+                                "num_units",
+                                "rate_at_orig",
+                                "note_amount",
+                                "preapproval",
+                                "application_channel",
+                                "AUS_name",
+                                "borrower_credit_model",
+                                "co-borrower_credit_model",
+                                "dti",
+                                "discount_points",
+                                "intro_rate_period",
+                                "land_property_interest",
+                                "property_value",
+                                "rural_tract",
+                                "mississippi_delta_county",
+                                "mid_appalachia_county",
+                                "persistent_poverty_county",
+                                "area_concentrated_poverty",
+                                "high_opportunity_area",
+                                "qualified_opportunity_zone_tract"]
+
+SINGLEFAMILY_CENSUS_DTYPES = {
+    "enterprise_flag": "int8",
+    "record_num": "int32",
+    "state_fips_code": "int8",
+    "msa_code": "int32",
+    "county_fips_code": "int16",
+    "census_tract": "int32",
+    "tract_pct_minority": "float32",
+    "tract_median_income": "int32",
+    "local_median_income": "int32",
+    "tract_income_ratio": "float32",
+    "borrower_income": "int32",
+    "local_median_family_income": "int32",
+    "borrower_income_ratio": "float32",
+    "upb": "int32",
+    "purpose": "int8",
+    "federal_guarantee": "int8",
+    "num_borrowers": "int8",
+    "first_time_buyer": "int8",
+    "borrower_race_1": "int8",
+    "borrower_race_2": "int8",
+    "borrower_race_3": "int8",
+    "borrower_race_4": "int8",
+    "borrower_race": "int8",
+    "borrower_ethnicity": "int8",
+    "co-borrower_race_1": "int8",
+    "co-borrower_race_2": "int8",
+    "co-borrower_race_3": "int8",
+    "co-borrower_race_4": "int8",
+    "co-borrower_race": "int8",
+    "co-borrower_ethnicity": "int8",
+    "borrower_gender": "int8",
+    "co-borrower_gender": "int8",
+    "borrower_age": "int8",
+    "co-borrower_age": "int8",
+    "occupancy_code": "int8",
+    "rate_spread": "float32",
+    "HOEPA_status": "int8",
+    "property_type": "int8",
+    "lien_status": "int8",
+    "borrower_62+": "int8",
+    "co-borrower_62+": "int8",
+    "ltv": "float32",
+    "date_of_note": "int8",
+    "term_at_orig": "int16",
+    "num_units": "int8",
+    "rate_at_orig": "float32",
+    "note_amount": "int32",
+    "preapproval": "int8",
+    "application_channel": "int8",
+    "AUS_name": "int8",
+    "borrower_credit_model": "int8",
+    "co-borrower_credit_model": "int8",
+    "dti": "int8",
+    "discount_points": "float32",
+    "intro_rate_period": "int16",
+    "land_property_interest": "int8",
+    "property_value": "int32",
+    "rural_tract": "int8",
+    "mississippi_delta_county": "int8",
+    "mid_appalachia_county": "int8",
+    "persistent_poverty_county": "int8",
+    "area_concentrated_poverty": "int8",
+    "high_opportunity_area": "int8",
+    "qualified_opportunity_zone_tract": "int8"
+}
+
+# documentation: https://fhfa.gov/DataTools/Downloads/Documents/Enterprise-PUDB/National-File-A/2022_Single_Family_National_File_A.pdf
+NATIONAL_A_COLNAMES = ["enterprise_flag",
+                       "record_num",
+                       "msa_code",
+                       "tract_pct_minority", # pre-2012: 2000 census data; 2012-2021: 2010 census data; 2022: 2020 census data
+                       "tract_income_ratio",
+                       "borrower_income_ratio",
+                       "ltv",
+                       "purpose",
+                       "federal_guarantee",
+                       "borrower_race",
+                       "co-borrower_race",
+                       "borrower_gender",
+                       "co-borrower_gender",
+                       "num_units",
+                       "affordability"]
+
+# National File A only carries coded (bucketed) values, so every field fits in a byte
+NATIONAL_A_DTYPES = {name: "int8" for name in NATIONAL_A_COLNAMES}
+NATIONAL_A_DTYPES["record_num"] = "int32"
+
+# fields that may be left out of the end of every row of a file (the 2022 Census Tract
+# files stop before qualified_opportunity_zone_tract); any other missing field is an error
+OPTIONAL_TRAILING_COLUMNS = {"qualified_opportunity_zone_tract"}
+
+# file layout: {first data year: (colnames, dtypes)}
+#
+# The PUDB layout changes over time (fields are added as the HMDA data behind them
+# grows), so layouts are versioned by the first data year they apply to, like the
+# cleaning schemas in cleaning.py. The layouts below have been checked against the
+# 2018-2022 documentation; add an entry for the first year a file's documentation
+# lists different fields, rather than editing an existing layout.
+LAYOUTS = {
+    "census": {2018: (SINGLEFAMILY_CENSUS_COLNAMES, SINGLEFAMILY_CENSUS_DTYPES)},
+    "national_a": {2018: (NATIONAL_A_COLNAMES, NATIONAL_A_DTYPES)},
+}
+
+# dataset: file layout
+DATASET_LAYOUTS = {
+    "Singlefamily-Census-Freddie": "census",
+    "Singlefamily-Census-Fannie": "census",
+    "Singlefamily-National-A-Fannie": "national_a",
+    "Singlefamily-National-A-Freddie": "national_a"
+}
+
+
+def get_layout(layout, year=None, strict=False):
+    """Return (colnames, dtypes) of `layout` for data `year` (the most recent layout if None).
+
+    Years before the first registered layout get that layout with a warning, or a
+    ValueError if `strict` (its columns may not line up with the file's).
+    """
+    versions = LAYOUTS[layout]
+    first_years = sorted(versions)
+    if year is None:
+        return versions[first_years[-1]]
+    applicable = [y for y in first_years if y <= year]
+    if not applicable:
+        if strict:
+            raise ValueError(f"no {layout} layout is registered for {year} data (the first is for "
+                             f"{first_years[0]}); add the layout from that year's documentation to LAYOUTS")
+        print(f"warning: the {layout} layout has not been checked against {year} data, using the {first_years[0]} layout")
+        return versions[first_years[0]]
+    return versions[applicable[-1]]
+
+
+def get_schema(dataset, year=None, strict=False):
+    """Return (colnames, dtypes) for `dataset` in data `year`, or (None, {}) if it has no known layout."""
+    if dataset not in DATASET_LAYOUTS:
+        return None, {}
+    return get_layout(DATASET_LAYOUTS[dataset], year, strict)
@@ -0,0 +1,165 @@
+import numpy as np
+import pandas as pd
+
+from .cleaning import dti_to_label
+
+# Reproducible samples of a loan file drawn while it is streamed in chunks.
+#
+# Every row gets a pseudo-random key in [0, 1) computed from the seed and the row's
+# position in the stream (a splitmix64 hash), so the sample does not depend on how
+# the file is chunked or parsed. A sample is the rows with the smallest keys:
+#   - size=n keeps the n smallest keys overall (a reservoir sample)
+#   - fraction=f keeps the round(f * N) smallest keys, where N is the number of rows
+#   - fraction=f with stratify keeps f * N_s rows of every stratum s, rounded down or
+#     up at random (with the seed) so that every stratum gets exactly f * N_s rows on
+#     average, and the sample f * N rows rounded down or up; each state / county / DTI
+#     category has its share of the rows, including strata with fewer than 1 / f rows,
+#     which rounding each stratum to the nearest integer would leave out altogether
+#     (the notebooks' df.sample(frac=...) is only right on average)
+# Since N is only known at the end, rows are kept while their key is below a bound
+# that the final cut-off exceeds with overwhelming probability (about five standard
+# deviations above f, for the number of rows of the stratum seen so far), and the
+# bound tightens as more rows arrive. Memory is proportional to the sample, plus a
+# margin of about 5 * sqrt(f * N_s) + 10 rows per stratum.
+#
+# Strata are "state", "county" (state and county code), "dti_cat" (the cleaned DTI
+# category), or the name of any column.
+
+BOUND_SIGMAS = 5.0
+
+GOLDEN_GAMMA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def splitmix64(values):
+    z = values.astype(np.uint64) + GOLDEN_GAMMA
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def random_keys(seed, rows):
+    """Uniform keys in [0, 1) for the row positions `rows`, the same for a given seed however rows are chunked."""
+    seed_mix = splitmix64(np.array([seed], dtype=np.uint64))[0]
+    with np.errstate(over="ignore"):
+        z = splitmix64(np.asarray(rows, dtype=np.uint64) * GOLDEN_GAMMA + seed_mix)
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def stratum_values(chunk, stratify):
+    if stratify == "state":
+        return chunk["state_fips_code"].to_numpy()
+    if stratify == "county":
+        return chunk["state_fips_code"].to_numpy().astype(np.int64) * 1000 + chunk["county_fips_code"].to_numpy()
+    if stratify == "dti_cat":
+        return dti_to_label(chunk["dti"]).codes
+    return chunk[stratify].to_numpy()
+
+
+class StreamSampler:
+    """Fed raw chunks with update(); result() returns the sample in file order."""
+
+    def __init__(self, fraction=None, size=None, stratify=None, seed=42):
+        if (fraction is None) == (size is None):
+            raise ValueError("give either a fraction or a sample size")
+        if fraction is not None and not 0 < fraction <= 1:
+            raise ValueError(f"fraction must be in (0, 1], got {fraction}")
+        if size is not None and stratify is not None:
+            raise ValueError("stratified samples take a fraction, not a size")
+        self.fraction = fraction
+        self.size = size
+        self.stratify = stratify
+        self.seed = seed
+        self.rows_seen = 0
+        self.strata = {} # stratum value: code
+        self.counts = np.zeros(0, dtype=np.int64) # rows seen per stratum code
+        self.pool = [] # candidate rows, with _key, _stratum and _row columns
+        self.pool_rows = 0
+        self.pruned_rows = 0
+
+    def _codes(self, chunk):
+        if self.stratify is None:
+            codes = np.zeros(len(chunk), dtype=np.int64)
+            if not self.strata:
+                self.strata[None] = 0
+        else:
+            chunk_codes, uniques = pd.factorize(stratum_values(chunk, self.stratify), use_na_sentinel=False)
+            mapping = np.array([self.strata.setdefault(value, len(self.strata)) for value in uniques.tolist()],
+                               dtype=np.int64)
+            codes = mapping[chunk_codes]
+        if len(self.strata) > len(self.counts):
+            self.counts = np.concatenate([self.counts, np.zeros(len(self.strata) - len(self.counts), dtype=np.int64)])
+        self.counts += np.bincount(codes, minlength=len(self.counts))
+        return codes
+
+    def _bounds(self):
+        # per stratum: keys above this are not in the final sample (with probability 1 - ~2e-7)
+        if self.size is not None:
+            if self.pool_rows < self.size:
+                return np.ones(1)
+            keys = np.concatenate([frame["_key"].to_numpy() for frame in self.pool])
+            return np.array([np.partition(keys, self.size - 1)[self.size - 1]])
+        # a stratum needs at most f * n + 1 rows; the bound leaves a margin of BOUND_SIGMAS
+        # standard deviations (of a Poisson count) plus 2 * BOUND_SIGMAS rows for small strata
+        n = np.maximum(self.counts, 1)
+        needed = self.fraction * n + 1
+        return np.minimum(1.0, (needed + BOUND_SIGMAS * np.sqrt(needed) + 2 * BOUND_SIGMAS) / n)
+
+    def update(self, chunk):
+        rows = np.arange(self.rows_seen, self.rows_seen + len(chunk))
+        self.rows_seen += len(chunk)
+        keys = random_keys(self.seed, rows)
+        codes = self._codes(chunk)
+        keep = keys <= self._bounds()[codes]
+        if keep.any():
+            candidates = chunk[keep].assign(_key=keys[keep], _stratum=codes[keep], _row=rows[keep])
+            self.pool.append(candidates)
+            self.pool_rows += len(candidates)
+        if self.pool_rows > 2 * max(self.pruned_rows, 1024):
+            self._prune()
+
+    def _prune(self):
+        if not self.pool:
+            return
+        pool = pd.concat(self.pool, ignore_index=True) if len(self.pool) > 1 else self.pool[0]
+        pool = pool[pool["_key"].to_numpy() <= self._bounds()[pool["_stratum"].to_numpy()]]
+        self.pool = [pool]
+        self.pool_rows = self.pruned_rows = len(pool)
+
+    def result(self):
+        self._prune()
+        if not self.pool:
+            return pd.DataFrame()
+        pool = self.pool[0].sort_values(["_stratum", "_key"], kind="stable")
+        strata = pool["_stratum"].to_numpy()
+        if self.size is not None:
+            targets = np.array([self.size])
+        else:
+            targets = self._targets()
+        # position of each row within its stratum, by key
+        starts = np.searchsorted(strata, strata, side="left")
+        rank = np.arange(len(pool)) - starts
+        sample = pool[rank < targets[strata]].sort_values("_row")
+        return sample.drop(columns=["_key", "_stratum", "_row"]).reset_index(drop=True)
+
+
+    def _targets(self):
+        # rows per stratum: f * N_s rounded down or up by systematic sampling, i.e. the whole numbers
+        # passed by a random offset u as it walks the cumulative shares, so a stratum is rounded
+        # up with probability equal to its remainder
+        shares = self.fraction * self.counts
+        if self.stratify is None:
+            return np.round(shares).astype(np.int64)
+        rng = np.random.default_rng(self.seed)
+        order = rng.permutation(len(shares))
+        passed = np.floor(np.cumsum(shares[order]) + rng.random())
+        targets = np.empty(len(shares), dtype=np.int64)
+        targets[order] = np.diff(passed, prepend=0)
+        return targets
+
+
+def sample_chunks(chunks, fraction=None, size=None, stratify=None, seed=42):
+    """Sample an iterable of raw chunks, e.g. get_data_chunks(...); see StreamSampler."""
+    sampler = StreamSampler(fraction, size, stratify, seed)
+    for chunk in chunks:
+        sampler.update(chunk)
+    return sampler.result()
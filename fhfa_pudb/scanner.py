@@ -0,0 +1,262 @@
+import itertools
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from .archive_cache import default_cache
+from .columnar_cache import ColumnsDontFit, _import_pyarrow, arrow_schema, chunk_table, write_widening
+from .ingest import DEFAULT_CHUNKSIZE, open_archive_member
+from .pudb_schema import SCHEMA_VERSION, get_schema
+
+# Lazy scans over several datasets and years with filter and column pushdown.
+#
+#     scan(["Singlefamily-Census-Freddie"], range(2018, 2023)).filter(state=13).select("ltv", "dti").to_pandas()
+#
+# builds a plan and reads nothing until to_pandas() (or iter_frames()). Then, for
+# every (dataset, year) left after the year filter, the loan file is parsed once, with
+# the column layout of its year from pudb_schema.py, into a Parquet store in
+# scan/<dataset>_<year>_<archive sha256>_v<SCHEMA_VERSION>/ next to the archive cache.
+# The store is partitioned by state (one directory per state) and, once the whole file
+# is written, each state's rows are rewritten sorted by county into one file, so:
+#   - a state filter only opens the files of those states
+#   - a county filter skips the row groups whose county statistics exclude it
+#   - other filters (purpose, or any other column) are evaluated on just the filter
+#     columns, before the selected columns of the matching rows are decoded
+#   - only the selected columns are read at all
+# Columns that a year's layout does not have come back as NaN, so frames of different
+# years line up. Every frame gets a "year" column. Reading a year that has no layout in
+# pudb_schema.LAYOUTS raises ValueError, rather than parsing it with another year's.
+#
+# Requires pyarrow (pip install pyarrow).
+
+PARTITION_COLUMN = "state_fips_code"
+SORT_COLUMN = "county_fips_code"
+ROW_GROUP_ROWS = 32_768 # small enough for county statistics to skip most of a state's rows
+
+# filter names: the column they filter
+FILTER_COLUMNS = {"state": "state_fips_code", "purpose": "purpose"}
+
+
+def _import_dataset():
+    pa, _ = _import_pyarrow()
+    import pyarrow.dataset as ds
+    return pa, ds
+
+
+def scan_path(cache, dataset, year, archive):
+    sha256 = os.path.splitext(os.path.basename(archive))[0]
+    return os.path.join(cache.cache_dir, "scan", f"{dataset}_{year}_{sha256[:16]}_v{SCHEMA_VERSION}")
+
+
+def write_scan_store(path, archive, member, parser, dataset, year, chunksize=DEFAULT_CHUNKSIZE):
+    """Parse `member` of `archive` into a Parquet store at `path`, partitioned by state and sorted by county."""
+    pa, ds = _import_dataset()
+    _, dtypes = get_schema(dataset, year, strict=True)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def write(widened):
+        tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path), suffix=".part")
+        failed = None
+        try:
+            with open_archive_member(archive, member) as fileobj:
+                with parser(fileobj, chunksize=chunksize) as reader:
+                    chunks = iter(reader)
+                    first = next(chunks, None)
+                    if first is None:
+                        raise ValueError(f"{member} in {archive} is empty")
+                    schema = arrow_schema(first, dtypes, widened)
+
+                    def batches():
+                        nonlocal failed
+                        for chunk in itertools.chain([first], chunks):
+                            try:
+                                table = chunk_table(chunk, schema)
+                            except ColumnsDontFit as e:
+                                # pyarrow re-raises errors from this generator as its own
+                                failed = e
+                                raise
+                            yield from table.to_batches()
+
+                    partitioning = None
+                    if PARTITION_COLUMN in schema.names:
+                        partitioning = ds.partitioning(pa.schema([schema.field(PARTITION_COLUMN)]), flavor="hive")
+                    try:
+                        ds.write_dataset(pa.RecordBatchReader.from_batches(schema, batches()), tmp_path,
+                                         format="parquet", partitioning=partitioning,
+                                         max_rows_per_group=ROW_GROUP_ROWS, min_rows_per_group=ROW_GROUP_ROWS,
+                                         existing_data_behavior="overwrite_or_ignore")
+                    except Exception:
+                        if failed is not None:
+                            raise failed
+                        raise
+            if partitioning is not None and SORT_COLUMN in schema.names:
+                for name in os.listdir(tmp_path):
+                    sort_partition(os.path.join(tmp_path, name))
+            try:
+                os.replace(tmp_path, path)
+            except OSError:
+                # another process finished writing the same store first (the target directory isn't
+                # empty); both were parsed from the same archive, so use that one
+                if not os.path.isdir(path):
+                    raise
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+
+    write_widening(write, f"{dataset} {year}")
+
+def sort_partition(directory):
+    # rows arrive in file order, so until now a state's rows are only grouped into partition files;
+    # one state at a time, rewrite them as one file sorted by county (a few % of a year's rows)
+    _, ds = _import_dataset()
+    import pyarrow.parquet as pq
+
+    files = [os.path.join(directory, name) for name in os.listdir(directory)]
+    table = ds.dataset(files, format="parquet").to_table().sort_by(SORT_COLUMN)
+    pq.write_table(table, os.path.join(directory, "sorted.parquet.part"), row_group_size=ROW_GROUP_ROWS)
+    for name in files:
+        os.remove(name)
+    os.replace(os.path.join(directory, "sorted.parquet.part"), os.path.join(directory, "part-0.parquet"))
+
+
+def open_scan_store(path, dtypes):
+    pa, ds = _import_dataset()
+    partitioning = None
+    if any(name.startswith(PARTITION_COLUMN + "=") for name in os.listdir(path)):
+        # the partition column is only stored in the directory names, so its type comes from the layout
+        field = pa.field(PARTITION_COLUMN, pa.from_numpy_dtype(dtypes.get(PARTITION_COLUMN, "int32")))
+        partitioning = ds.partitioning(pa.schema([field]), flavor="hive")
+    return ds.dataset(path, format="parquet", partitioning=partitioning)
+
+
+def filter_expression(filters):
+    """pyarrow expression for {column: allowed values} and [(state, county)] filters, or None."""
+    _, ds = _import_dataset()
+    expression = None
+    for column, values in filters.items():
+        if column == "county":
+            # (state, county) pairs; the state condition also selects the partitions
+            states = sorted({state for state, _ in values})
+            term = ds.field("state_fips_code").isin(states)
+            pairs = None
+            for state, county in values:
+                pair = (ds.field("state_fips_code") == state) & (ds.field("county_fips_code") == county)
+                pairs = pair if pairs is None else pairs | pair
+            term = term & pairs
+        else:
+            term = ds.field(column).isin(list(values))
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def _values(value):
+    return [value] if isinstance(value, (int, str)) else list(value)
+
+
+def _county_pairs(counties):
+    # 5 digit county codes (e.g. "13121" or 13121) to (state, county) pairs
+    return [(int(county) // 1000, int(county) % 1000) for county in _values(counties)]
+
+
+class Scan:
+    """A lazy scan of `datasets` for `years`; nothing is read until to_pandas() or iter_frames().
+
+    `source(dataset, year)` returns the (url, member, parser) of a loan file, see
+    get_source in fhfa_pudb/sources.py. filter() and select() return new scans.
+    """
+
+    def __init__(self, datasets, years, source, columns=None, filters=None, cache=None):
+        self.datasets = [datasets] if isinstance(datasets, str) else list(datasets)
+        self.years = sorted(years)
+        self.source = source
+        self.columns = columns
+        self.filters = filters or {}
+        self.cache = cache
+
+    def _replace(self, **changes):
+        kwargs = {"columns": self.columns, "filters": self.filters, "cache": self.cache}
+        kwargs.update(changes)
+        return Scan(self.datasets, kwargs.pop("years", self.years), self.source, **kwargs)
+
+    def select(self, *columns):
+        """Only read `columns`."""
+        unknown = [name for name in columns if not any(name in self._colnames(dataset, year)
+                                                       for dataset, year in self.fragments())]
+        if unknown:
+            raise ValueError(f"unknown columns {unknown}, see the layouts in pudb_schema.py")
+        return self._replace(columns=list(columns))
+
+    def filter(self, year=None, state=None, county=None, **columns):
+        """Keep the loans whose values are (one of) the given values.
+
+        year, state (e.g. 13) and purpose take a value or a list of values, county takes
+        5 digit county codes (e.g. "13121"), and any other column of the layout can be
+        filtered the same way by name. Filters of the same column are intersected.
+        """
+        years = self.years if year is None else [y for y in self.years if y in set(_values(year))]
+        filters = dict(self.filters)
+        given = {FILTER_COLUMNS.get(name, name): _values(value) for name, value in columns.items()}
+        if state is not None:
+            given["state_fips_code"] = _values(state)
+        if county is not None:
+            given["county"] = _county_pairs(county)
+        for column, values in given.items():
+            filters[column] = values if column not in filters else [v for v in filters[column] if v in values]
+        return self._replace(years=years, filters=filters)
+
+    def fragments(self):
+        return [(dataset, year) for year in self.years for dataset in self.datasets]
+
+    def _colnames(self, dataset, year):
+        colnames, _ = get_schema(dataset, year, strict=True)
+        return colnames or []
+
+    def store(self, dataset, year):
+        """Path of the Parquet store of one loan file, parsing the file into it first if needed."""
+        # a year without a registered layout would be parsed with another year's column names
+        get_schema(dataset, year, strict=True)
+        url, member, parser = self.source(dataset, year)
+        cache = self.cache or default_cache()
+        archive = cache.fetch(dataset, year, url)
+        path = scan_path(cache, dataset, year, archive)
+        if not os.path.exists(path):
+            write_scan_store(path, archive, member, parser, dataset, year)
+        return path
+
+    def read(self, dataset, year):
+        """The loans of one (dataset, year) that pass the filters, with the selected columns and a year column."""
+        colnames, dtypes = get_schema(dataset, year, strict=True)
+        store = open_scan_store(self.store(dataset, year), dtypes)
+        available = store.schema.names
+        columns = self.columns or [name for name in colnames or available if name in available]
+        usable = set(available) | ({"county"} if {"state_fips_code", "county_fips_code"} <= set(available) else set())
+        filters = {column: values for column, values in self.filters.items() if column in usable}
+        if len(filters) < len(self.filters):
+            # a filter on a column this year does not have matches no loans
+            table = store.schema.empty_table().select([name for name in columns if name in available])
+        else:
+            table = store.to_table(columns=[name for name in columns if name in available],
+                                   filter=filter_expression(filters))
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        for name in columns:
+            if name not in df:
+                df[name] = float("nan")
+        df.insert(0, "year", pd.Series(year, index=df.index, dtype="int16"))
+        return df[["year"] + columns]
+
+    def iter_frames(self):
+        """Yield (dataset, year, frame) for every loan file in the scan."""
+        for dataset, year in self.fragments():
+            yield dataset, year, self.read(dataset, year)
+
+    def to_pandas(self):
+        frames = [df for _, _, df in self.iter_frames()]
+        if not frames:
+            return pd.DataFrame(columns=["year"] + (self.columns or []))
+        return pd.concat(frames, ignore_index=True)
+
+    def __repr__(self):
+        return (f"Scan(datasets={self.datasets}, years={self.years}, columns={self.columns or 'all'}, "
+                f"filters={self.filters})")
@@ -0,0 +1,114 @@
+import contextlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+# Runs the (dataset, year) job grid of the pipeline with overlapping network and CPU work.
+#
+# Archives are downloaded by a thread pool (the work is I/O bound and the archive
+# cache is thread safe). As soon as every dataset of a year is on disk, the year is
+# handed to a process pool that parses, cleans and aggregates it. At most
+# `max_in_flight` years are being processed or waiting to be consumed at once, which
+# bounds memory to roughly that many years of parsed data. Years are submitted and
+# yielded in order, so the output does not depend on which download finishes first.
+
+DEFAULT_DOWNLOAD_WORKERS = 4
+
+
+def with_retries(func, *args, retries=2, backoff=5):
+    for attempt in range(retries + 1):
+        try:
+            return func(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"warning: {func.__name__}{args} failed ({e!r}), retrying in {delay}s")
+            time.sleep(delay)
+
+
+def run_grid(years, datasets, fetch, process, jobs=None, download_workers=DEFAULT_DOWNLOAD_WORKERS,
+             max_in_flight=None, retries=2, backoff=5):
+    """Yield (year, process(year, {dataset: fetch(dataset, year)})) for each year, in order.
+
+    `fetch` runs in a thread pool and `process` in a pool of `jobs` processes, so
+    `process` must be picklable (a module level function). With jobs=1 everything
+    after the download runs in the calling process. Failed downloads and failed
+    processing are retried `retries` times with exponential backoff. If a worker
+    process dies (e.g. killed for running out of memory), the process pool is
+    replaced and every year that was running in it is submitted again.
+    """
+    years = list(years)
+    datasets = list(datasets)
+    jobs = jobs or os.cpu_count() or 1
+    max_in_flight = max_in_flight or jobs
+
+    fetched = {year: {} for year in years}
+    results = {}
+    attempts = {}
+    next_submit = 0
+    next_yield = 0
+
+    def make_pool():
+        return ProcessPoolExecutor(min(jobs, max_in_flight)) if jobs > 1 else ThreadPoolExecutor(1)
+
+    pool = make_pool()
+    with ThreadPoolExecutor(download_workers) as downloads, contextlib.ExitStack() as cleanup:
+        # shuts down whichever process pool is current at the end
+        cleanup.callback(lambda: pool.shutdown())
+        pending = {}
+        for year in years:
+            for dataset in datasets:
+                future = downloads.submit(with_retries, fetch, dataset, year, retries=retries, backoff=backoff)
+                pending[future] = ("fetch", dataset, year)
+
+        while next_yield < len(years):
+            # submit years in order while there is room, so the next year to be yielded is never starved
+            in_flight = (next_submit - next_yield)
+            while (next_submit < len(years) and in_flight < max_in_flight
+                   and len(fetched[years[next_submit]]) == len(datasets)):
+                year = years[next_submit]
+                pending[pool.submit(process, year, fetched[year])] = ("process", None, year)
+                attempts[year] = 1
+                next_submit += 1
+                in_flight += 1
+
+            # hand out finished years in order
+            while next_yield < len(years) and years[next_yield] in results:
+                year = years[next_yield]
+                yield year, results.pop(year)
+                fetched.pop(year)
+                next_yield += 1
+            if next_yield == len(years) or not pending:
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future not in pending:
+                    # ran in a broken pool and was already submitted again
+                    continue
+                kind, dataset, year = pending.pop(future)
+                if kind == "fetch":
+                    # with_retries already retried, so a failure here is final
+                    fetched[year][dataset] = future.result()
+                    continue
+                try:
+                    results[year] = future.result()
+                except Exception as e:
+                    if attempts[year] > retries:
+                        raise
+                    delay = backoff * 2 ** (attempts[year] - 1)
+                    print(f"warning: processing {year} failed ({e!r}), retrying in {delay}s")
+                    time.sleep(delay)
+                    attempts[year] += 1
+                    retry = [year]
+                    if isinstance(e, BrokenProcessPool):
+                        # a dead worker breaks the whole pool, so every year in it failed too; only this
+                        # year's attempt is counted, since there is no telling which worker died
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        pool = make_pool()
+                        broken = [f for f, (kind, _, _) in pending.items() if kind == "process"]
+                        retry += [pending.pop(f)[2] for f in broken]
+                    for year in retry:
+                        pending[pool.submit(process, year, fetched[year])] = ("process", None, year)
@@ -0,0 +1,163 @@
+import functools as ft
+import os
+
+from .instrumentation import stage
+from .pudb_schema import get_layout
+
+# Where each PUDB loan file comes from and how it is parsed: the one implementation of
+# get_url, get_filename, get_parser and get_data, used by pull_data.py,
+# calculate_county_averages.py and the fhfa_pudb command line.
+#
+# Importing this module does no I/O and doesn't import pandas or urllib: downloading,
+# parsing, the columnar cache and the scanner import their dependencies on first use.
+
+BASE_URL = "https://www.fhfa.gov/DataTools/Downloads/Documents/Enterprise-PUDB/"
+
+# dataset: archive path under BASE_URL
+ARCHIVE_PATHS = {
+    "Multifamily-Census": "Multi-Family_Census_Tract_File_/{year}_MFCensusTract{year}.zip",
+    "Multifamily-National": "Multi-Family_National_File_/{year}_MFNationalFile{year}.zip",
+    "Singlefamily-Census-Fannie": "Single-Family_Census_Tract_File_/{year}_SFCensusTractFNM{year}.zip",
+    "Singlefamily-Census-Freddie": "Single-Family_Census_Tract_File_/{year}_SFCensusTractFRE{year}.zip",
+    "Singlefamily-National-A-Fannie": "National-File-A/{year}_SFNationalFileA{year}.zip",
+    "Singlefamily-National-A-Freddie": "National-File-A/{year}_SFNationalFileA{year}.zip",
+    "Singlefamily-National-B-Fannie": "National-File-B/{year}_SFNationalFileB{year}.zip",
+    "Singlefamily-National-B-Freddie": "National-File-B/{year}_SFNationalFileB{year}.zip",
+    "Singlefamily-National-C-Fannie": "National-File-C/{year}_SFNationalFileC{year}.zip",
+    "Singlefamily-National-C-Freddie": "National-File-C/{year}_SFNationalFileC{year}.zip"
+}
+
+# dataset: the name of the loan file within the downloaded zip file
+MEMBERS = {
+    "Singlefamily-Census-Freddie": "fhlmc_sf{year}c_loans.txt",
+    "Singlefamily-Census-Fannie": "fnma_sf{year}c_loans.txt",
+    "Singlefamily-National-A-Fannie": "fnma_sf{year}a_loans.txt",
+    "Singlefamily-National-A-Freddie": "fhlmc_sf{year}a_loans.txt"
+    # TODO
+}
+
+CENSUS_DATASETS = ["Singlefamily-Census-Fannie", "Singlefamily-Census-Freddie"]
+
+# set PUDB_PARSER=fast to parse the loan files with fast_parser.read_loans instead of pd.read_csv
+PARSER_ENGINE = os.environ.get("PUDB_PARSER", "pandas")
+
+
+def get_url(dataset, year):
+    if dataset not in ARCHIVE_PATHS:
+        raise ValueError(f"unknown dataset {dataset!r}, expected one of {list(ARCHIVE_PATHS)}")
+    return BASE_URL + ARCHIVE_PATHS[dataset].format(year=year)
+
+
+def get_filename(dataset, year):
+    member = MEMBERS.get(dataset)
+    return member.format(year=year) if member else None
+
+
+def get_parser(dataset, year=None):
+    # TODO: we can define how we parse each type of file differently
+    # for now, we assume we are only parsing a single file at a time
+    # with a year, the parser uses that year's column layout (see LAYOUTS in pudb_schema.py)
+    parser_map = {
+        "Singlefamily-Census-Freddie": parse_singlefamily_census,
+        "Singlefamily-Census-Fannie": parse_singlefamily_census,
+        "Singlefamily-National-A-Fannie": parse_national_a,
+        "Singlefamily-National-A-Freddie": parse_national_a
+    }
+    parser = parser_map.get(dataset, parse_default)
+    return parser if year is None else ft.partial(parser, year=year)
+
+
+def get_source(dataset, year):
+    # where a (dataset, year) loan file comes from and how to parse it
+    return get_url(dataset, year), get_filename(dataset, year), get_parser(dataset, year)
+
+
+def get_data(dataset, year, cache=None):
+    # archives are cached on disk and only re-downloaded when fhfa.gov reports a change
+    # pass cache=False to stream the archive through a temporary file instead
+    from .ingest import open_member
+
+    with open_member(dataset, year, get_url(dataset, year), get_filename(dataset, year), cache=cache) as fileobj:
+        return get_parser(dataset, year)(fileobj)
+
+
+def get_data_chunks(dataset, year, chunksize=None, cache=None):
+    # same as get_data, but yields DataFrames of at most `chunksize` rows (ingest.DEFAULT_CHUNKSIZE by default)
+    # so the whole file never has to fit in memory
+    from .ingest import DEFAULT_CHUNKSIZE, iter_chunks
+
+    return iter_chunks(dataset, year, get_url(dataset, year), get_filename(dataset, year), get_parser(dataset, year),
+                       chunksize=chunksize or DEFAULT_CHUNKSIZE, cache=cache)
+
+
+def get_sample(dataset, year, fraction=None, size=None, stratify=None, seed=42, cache=None):
+    # a reproducible sample of `fraction` of the loans (or `size` loans), drawn while the file is streamed in chunks,
+    # so memory is proportional to the sample; stratify by "state", "county", "dti_cat" or a column (see sampling.py)
+    from .sampling import sample_chunks
+
+    return sample_chunks(get_data_chunks(dataset, year, cache=cache), fraction, size, stratify, seed)
+
+
+def get_columns(dataset, year, columns=None, cache=None):
+    # typed, column-projected load: the first call parses the file once into the columnar cache,
+    # later calls only read `columns` (all columns if None) from it
+    from .columnar_cache import load_columns
+
+    return load_columns(dataset, year, get_url(dataset, year), get_filename(dataset, year), get_parser(dataset, year),
+                        columns=columns, cache=cache)
+
+
+def scan(datasets, years, cache=None):
+    # lazy multi-year load with filters and column selection pushed down to a Parquet store, e.g.
+    # scan(['Singlefamily-Census-Freddie'], range(2018, 2023)).filter(state=13).select('ltv', 'dti').to_pandas()
+    # only the files of the requested years are fetched, and only matching states and columns are read; see scanner.py
+    from .scanner import Scan
+
+    return Scan(datasets, years, get_source, cache=cache)
+
+
+def fetch_archive(dataset, year, cache=None):
+    # download (or revalidate) the archive and return its local path
+    from .archive_cache import default_cache
+
+    with stage("download", dataset, year) as s:
+        archive, downloaded = (cache or default_cache()).fetch_status(dataset, year, get_url(dataset, year))
+        s.record(bytes=downloaded) # 0 if the cached copy was still current
+    return archive
+
+
+def parse_archive(dataset, year, archive):
+    from .ingest import open_archive_member
+
+    with stage("parse", dataset, year) as s:
+        with open_archive_member(archive, get_filename(dataset, year)) as fileobj:
+            df = get_parser(dataset, year)(s.meter(fileobj))
+        s.record(rows=len(df))
+    return df
+
+
+def parse_default(fileobj, chunksize=None, usecols=None, year=None):
+    import pandas as pd
+
+    return pd.read_csv(fileobj, chunksize=chunksize, usecols=usecols)
+
+
+def parse_singlefamily_census(fileobj, chunksize=None, usecols=None, year=None):
+    # column layout of the data year (the most recent if None): see SINGLEFAMILY_CENSUS_COLNAMES in pudb_schema.py
+    return _parse_loans(fileobj, "census", year, chunksize, usecols)
+
+
+def parse_national_a(fileobj, chunksize=None, usecols=None, year=None):
+    # column layout of the data year (the most recent if None): see NATIONAL_A_COLNAMES in pudb_schema.py
+    return _parse_loans(fileobj, "national_a", year, chunksize, usecols)
+
+
+def _parse_loans(fileobj, layout, year, chunksize, usecols):
+    colnames, dtypes = get_layout(layout, year)
+    if PARSER_ENGINE == "fast":
+        from .fast_parser import read_loans
+
+        return read_loans(fileobj, colnames, dtypes, chunksize=chunksize, usecols=usecols)
+    import pandas as pd
+
+    return pd.read_csv(fileobj, names=colnames, delimiter=r"\s+", chunksize=chunksize, usecols=usecols) # TODO: clean
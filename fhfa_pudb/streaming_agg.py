@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+from .cleaning import get_cleaning_schema
+
+# Out-of-core version of clean_df + get_county_averages.
+#
+# A CountyAggregator is fed raw parsed chunks (e.g. from get_data_chunks) and keeps
+# only fixed-size state: per-county sums, loan counts and counts of missing values
+# in dense arrays indexed by the integer key state_fips_code * 1000 + county_fips_code,
+# plus exact, mergeable value counts of the columns clean_df imputes, for their modes
+# and medians. The imputed columns are codes, tract incomes and percentages with two
+# decimals, so they have at most a few hundred thousand distinct values; counting them
+# keeps the fill values, and so the averages, the same as clean_df's.
+#
+# Imputation does not need a second pass: a county's mean of an imputed column is
+# (sum of present values + missing count * fill value) / loan count, and loans with a
+# missing county are kept under county 0 of their state and folded into the imputed
+# (mode) county at the end. Aggregators built from different files or processes can
+# be merged, e.g. one per enterprise and year.
+
+N_KEYS = 100 * 1000 # state_fips_code (2 digits) * 1000 + county_fips_code (3 digits)
+MAX_STATE_FIPS = 56 # higher codes are territories
+
+# output column: (cleaned column, raw column it is read from)
+COUNTY_METRICS = {
+    "dti_avg": ("dti_num", "dti"),
+    "ltv_avg": ("ltv", "ltv"),
+    "income_estimate": ("tract_median_income", "tract_median_income"),
+    "pct_nonwhite_estimate": ("tract_pct_minority", "tract_pct_minority"),
+    "pct_first_time_buyer": ("first_time_buyer", "first_time_buyer"),
+}
+
+
+class ValueCounts:
+    """Exact, mergeable value counts, in memory proportional to the number of distinct values.
+
+    mode() matches pandas (smallest of the most common values) and median() matches
+    pandas and np.nanmedian (the mean of the two middle values for an even count).
+    """
+
+    def __init__(self):
+        self.values = np.empty(0)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self._add(*np.unique(values[~np.isnan(values)], return_counts=True))
+        return self
+
+    def merge(self, other):
+        self._add(other.values, other.counts)
+        return self
+
+    def _add(self, values, counts):
+        self.values, inverse = np.unique(np.concatenate([self.values, values]), return_inverse=True)
+        self.counts = np.bincount(inverse, weights=np.concatenate([self.counts, counts]),
+                                  minlength=len(self.values)).astype(np.int64)
+
+    def mode(self):
+        if not len(self.counts):
+            return np.nan
+        # values are sorted and argmax returns the first maximum
+        return self.values[np.argmax(self.counts)]
+
+    def median(self):
+        n = self.counts.sum()
+        if n == 0:
+            return np.nan
+        # the values at (0-based) positions (n - 1) // 2 and n // 2 of the sorted column
+        cumulative = np.cumsum(self.counts)
+        low, high = np.searchsorted(cumulative, [(n - 1) // 2, n // 2], side="right")
+        return (self.values[low] + self.values[high]) / 2
+
+
+class CountyAggregator:
+    """Streaming county averages of raw Single-Family Census Tract chunks for one data year."""
+
+    def __init__(self, year=None):
+        schema = get_cleaning_schema(year)
+        self.rules = {}
+        for cleaned in ["county_fips_code"] + [cleaned for cleaned, _ in COUNTY_METRICS.values()]:
+            sentinels, impute, _ = schema["columns"][cleaned]
+            self.rules[cleaned] = (sentinels, impute)
+
+        self.counts = np.zeros(N_KEYS, dtype=np.int64)
+        self.sums = {name: np.zeros(N_KEYS) for name in COUNTY_METRICS}
+        self.missing = {name: np.zeros(N_KEYS, dtype=np.int64) for name in COUNTY_METRICS}
+        self.sketches = {cleaned: ValueCounts() for cleaned in self.rules}
+
+    def update(self, chunk):
+        state = chunk["state_fips_code"].to_numpy()
+        county = self._present(chunk["county_fips_code"], "county_fips_code")
+        self.sketches["county_fips_code"].update(county)
+
+        keep = state <= MAX_STATE_FIPS
+        # a missing county is counted under county 0 of its state until the imputed county is known
+        key = state[keep].astype(np.int64) * 1000 + np.nan_to_num(county[keep]).astype(np.int64)
+        self.counts += np.bincount(key, minlength=N_KEYS)
+
+        for name, (cleaned, raw) in COUNTY_METRICS.items():
+            values = self._present(chunk[raw], cleaned)
+            self.sketches[cleaned].update(values)
+            values = values[keep]
+            is_missing = np.isnan(values)
+            self.sums[name] += np.bincount(key, weights=np.where(is_missing, 0, values), minlength=N_KEYS)
+            self.missing[name] += np.bincount(key[is_missing], minlength=N_KEYS)
+        return self
+
+    def merge(self, other):
+        self.counts += other.counts
+        for name in COUNTY_METRICS:
+            self.sums[name] += other.sums[name]
+            self.missing[name] += other.missing[name]
+        for cleaned, sketch in self.sketches.items():
+            sketch.merge(other.sketches[cleaned])
+        return self
+
+    def fill_values(self):
+        # the values clean_df imputes with
+        return {cleaned: self.sketches[cleaned].median() if impute == "median" else self.sketches[cleaned].mode()
+                for cleaned, (_, impute) in self.rules.items()}
+
+    def result(self):
+        """Return the same frame as get_county_averages(clean_df(<all chunks>))."""
+        fills = self.fill_values()
+        counts = self.counts.copy()
+        sums = {name: sums.copy() for name, sums in self.sums.items()}
+        missing = {name: missing.copy() for name, missing in self.missing.items()}
+
+        # move loans with a missing county to the imputed county of their state
+        mode_county = int(fills["county_fips_code"])
+        unknown = np.arange(0, N_KEYS, 1000)
+        for arrays in [[counts], sums.values(), missing.values()]:
+            for array in arrays:
+                array[unknown + mode_county] += array[unknown]
+                array[unknown] = 0
+
+        keys = np.flatnonzero(counts)
+        means = {}
+        for name, (cleaned, _) in COUNTY_METRICS.items():
+            means[name] = (sums[name][keys] + missing[name][keys] * fills[cleaned]) / counts[keys]
+
+        index = pd.Index([str(key).zfill(5) for key in keys], name="county")
+        return pd.DataFrame({
+            "dti_avg": pd.Series(means["dti_avg"], index=index).round(3),
+            "ltv_avg": pd.Series(means["ltv_avg"], index=index).round(3),
+            "income_estimate": pd.Series(means["income_estimate"], index=index).round(0).astype("int"), # not a good estimate
+            "pct_nonwhite_estimate": pd.Series(means["pct_nonwhite_estimate"], index=index).round(3), # not a good estimate
+            "pct_first_time_buyer": pd.Series(means["pct_first_time_buyer"], index=index).mul(-100).add(200).round(3)
+        })
+
+    def _present(self, values, cleaned):
+        # float copy of a raw column with its sentinel codes replaced by NaN
+        values = np.asarray(values, dtype=np.float64)
+        sentinels, _ = self.rules[cleaned]
+        if sentinels:
+            values = np.where(np.isin(values, sentinels), np.nan, values)
+        return values
+
+
+def aggregate_chunks(chunks, year=None):
+    aggregator = CountyAggregator(year)
+    for chunk in chunks:
+        aggregator.update(chunk)
+    return aggregator
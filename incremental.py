@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/incremental.py. Importing incremental still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import incremental
+
+sys.modules[__name__] = incremental
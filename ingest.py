@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/ingest.py. Importing ingest still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import ingest
+
+sys.modules[__name__] = ingest
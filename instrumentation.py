@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/instrumentation.py. Importing instrumentation still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import instrumentation
+
+sys.modules[__name__] = instrumentation
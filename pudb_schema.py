@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/pudb_schema.py. Importing pudb_schema still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import pudb_schema
+
+sys.modules[__name__] = pudb_schema
@@ -0,0 +1,175 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+# Local HTTP service answering slice queries over county_averages_by_year.csv, so the
+# visualization can fetch one metric and year instead of the whole file.
+#
+# The CSV is loaded into a columnar index: the county codes, the rows of each state,
+# and one float array per (metric, year) column. Responses are compact choropleth
+# payloads, {"metric": ..., "year": ..., "values": {county: value}}, encoded to JSON
+# and gzip once and kept in memory; the nation-wide payload of every metric and year
+# is built at load time and state slices on first request. Each payload has an ETag
+# derived from its content, so clients can revalidate with If-None-Match. The file's
+# modification time and size are checked on every request, and when the pipeline
+# writes new aggregates the index and all payloads are rebuilt, which changes the
+# ETags of whatever changed.
+#
+# Endpoints:
+#   /meta                                 metrics, years and states available
+#   /counties?metric=dti_avg&year=2022    one metric for one year (optionally &state=06)
+#   /counties?metric=dti_avg              one metric for all years: values per year
+#
+# usage: python query_service.py --csv county_averages_by_year.csv --port 8000
+
+DEFAULT_CSV = "county_averages_by_year.csv"
+DEFAULT_PORT = 8000
+
+
+class AggregateIndex:
+    """In-memory columnar index of a wide county-by-year aggregates CSV, with a cache of encoded payloads."""
+
+    def __init__(self, path=DEFAULT_CSV):
+        self.path = path
+        self.lock = threading.RLock()
+        self.version = None
+        self.refresh()
+
+    def refresh(self):
+        # reload when the file changed since it was last loaded
+        stat = os.stat(self.path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self.version:
+            return False
+        with self.lock:
+            if version != self.version:
+                self._load()
+                self.version = version
+        return True
+
+    def _load(self):
+        df = pd.read_csv(self.path, dtype={"county": str}).set_index("county")
+        columns = {}
+        for column in df.columns:
+            metric, _, year = column.rpartition("_")
+            if metric and year.isdigit():
+                columns[metric, int(year)] = df[column].to_numpy(dtype=np.float64)
+        self.counties = df.index.to_numpy()
+        states = pd.Series(self.counties).str[:2]
+        self.state_rows = {state: rows.to_numpy() for state, rows in states.groupby(states).groups.items()}
+        self.columns = columns
+        self.metrics = sorted({metric for metric, _ in columns})
+        self.years = sorted({year for _, year in columns})
+        self.payloads = {}
+        for metric, year in columns:
+            self.payload(metric, year)
+
+    def payload(self, metric=None, year=None, state=None):
+        """Return (json bytes, gzip bytes, etag) for a query, building and caching it on first use."""
+        key = (metric, year, state)
+        cached = self.payloads.get(key)
+        if cached is None:
+            # under the lock so a payload is never built from a half reloaded index
+            with self.lock:
+                body = json.dumps(self._answer(metric, year, state), separators=(",", ":")).encode("utf-8")
+                etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+                cached = self.payloads[key] = (body, gzip.compress(body, compresslevel=6, mtime=0), etag)
+        return cached
+
+    def _answer(self, metric, year, state):
+        if metric is None:
+            return {"metrics": self.metrics, "years": self.years, "states": sorted(self.state_rows)}
+        if metric not in self.metrics:
+            raise KeyError(f"unknown metric {metric!r}, expected one of {self.metrics}")
+        if state is not None and state not in self.state_rows:
+            raise KeyError(f"unknown state {state!r}")
+        if year is not None and (metric, year) not in self.columns:
+            raise KeyError(f"no {metric} for {year}, years are {self.years}")
+        rows = self.state_rows[state] if state is not None else slice(None)
+        counties = self.counties[rows].tolist()
+        answer = {"metric": metric, "year": year, "state": state}
+        if year is not None:
+            answer["values"] = self._values(counties, self.columns[metric, year][rows])
+        else:
+            answer["values"] = {str(y): self._values(counties, self.columns[metric, y][rows])
+                                for y in self.years if (metric, y) in self.columns}
+        return answer
+
+    @staticmethod
+    def _values(counties, values):
+        # counties without data that year (an outer join) are left out rather than sent as null
+        present = ~np.isnan(values)
+        return dict(zip(np.asarray(counties)[present].tolist(), values[present].tolist()))
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    index = None # set by make_server
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            self.index.refresh()
+            if url.path == "/meta":
+                body, compressed, etag = self.index.payload()
+            elif url.path == "/counties":
+                year = int(query["year"]) if "year" in query else None
+                state = query["state"].zfill(2) if "state" in query else None
+                body, compressed, etag = self.index.payload(query["metric"], year, state)
+            else:
+                return self.send_error(404, "unknown endpoint, expected /meta or /counties")
+        except KeyError as e:
+            return self.send_error(400, f"bad query: {e.args[0]}")
+        except ValueError:
+            return self.send_error(400, "year must be a number")
+
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        use_gzip = "gzip" in self.headers.get("Accept-Encoding", "")
+        data = compressed if use_gzip else body
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", etag)
+        # revalidate every time, so clients see new aggregates as soon as they are written
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*") # fetched from the notebook in the browser
+        self.send_header("Vary", "Accept-Encoding")
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(csv_path=DEFAULT_CSV, host="127.0.0.1", port=DEFAULT_PORT, verbose=True):
+    handler = type("Handler", (QueryHandler,), {"index": AggregateIndex(csv_path)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.verbose = verbose
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--csv", default=DEFAULT_CSV)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    server = make_server(args.csv, args.host, args.port)
+    print(f"serving {args.csv} on http://{args.host}:{server.server_port}/")
+    server.serve_forever()
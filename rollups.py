@@ -0,0 +1,215 @@
+import numpy as np
+import pandas as pd
+
+from fhfa_pudb.streaming_agg import COUNTY_METRICS, MAX_STATE_FIPS
+
+# Tract, county, MSA and state rollups of cleaned Census Tract loans from one grouped pass.
+#
+# Every loan gets a single integer key packing its geography:
+#     state (2 digits) | county (3) | tract (6) | msa (5)
+# where the first 11 digits are the tract's census GEOID. The loans are grouped on
+# that key once (a hash pass with pd.factorize), producing partial aggregates per
+# (tract, msa): loan counts, sums and present-value counts per column, and for
+# quantiles the exact count of every distinct value. Coarser levels are computed from
+# these partials instead of the loans: tracts roll up into counties and counties
+# into states by dropping digits from the key, and MSAs are the last 5 digits.
+# Because the partials are sums and value counts, quantiles at every level are exact
+# and means only differ from a groupby on the loans by floating point summation order.
+#
+# Metrics are given as {output name: spec}, where spec is one of
+#   (column, "mean")                  mean of the loans' values
+#   (column, "mean", weight_column)   weighted mean, e.g. ("ltv", "mean", "upb")
+#   (column, q) with 0 <= q <= 1      quantile, interpolated like pandas' quantile()
+# Every level also gets a "loans" column with the number of loans.
+
+LEVELS = ["tract", "county", "msa", "state"]
+LEVEL_DIGITS = {"tract": 11, "county": 5, "msa": 5, "state": 2}
+
+# the five county metrics of get_county_averages, before rounding
+DEFAULT_METRICS = {name: (cleaned, "mean") for name, (cleaned, _) in COUNTY_METRICS.items()}
+
+
+def geo_key(state, county, tract, msa):
+    return ((state * 1000 + county) * 1000000 + tract) * 100000 + msa
+
+
+def parent_key(level, keys):
+    # key of `level` from the keys of the partials it is derived from (see DERIVED_FROM)
+    if level == "tract":
+        return keys // 100000
+    if level == "msa":
+        return keys % 100000
+    if level == "county":
+        return keys // 1000000
+    return keys // 1000 # state from county
+
+
+# level: the level whose partials it is derived from (None is the loan level key)
+DERIVED_FROM = {"tract": None, "msa": None, "county": "tract", "state": "county"}
+
+
+class Partials:
+    """Mergeable aggregates of loans grouped by integer key at one level."""
+
+    def __init__(self, keys, counts, sums, present, weighted, distributions):
+        self.keys = keys # sorted unique keys
+        self.counts = counts # loans per key
+        self.sums = sums # {column: sum of present values per key}
+        self.present = present # {column: number of present (non NaN) values per key}
+        self.weighted = weighted # {(column, weight): (sum of weight * value, sum of weight) per key}
+        # {column: (key index, value, count)} sorted by key index and value: the exact distribution per key
+        self.distributions = distributions
+
+    @classmethod
+    def from_loans(cls, keys, columns, weights=(), quantiles=()):
+        """Group loans by `keys`; columns holds every column used, as float arrays aligned with keys."""
+        codes, uniques = pd.factorize(keys, sort=True)
+        n = len(uniques)
+        counts = np.bincount(codes, minlength=n)
+        sums, present = {}, {}
+        for name, values in columns.items():
+            missing = np.isnan(values)
+            sums[name] = np.bincount(codes, weights=np.where(missing, 0, values), minlength=n)
+            present[name] = np.bincount(codes[~missing], minlength=n)
+        weighted = {}
+        for name, weight in weights:
+            values, w = columns[name], columns[weight]
+            usable = ~(np.isnan(values) | np.isnan(w))
+            weighted[name, weight] = (np.bincount(codes[usable], weights=(w * values)[usable], minlength=n),
+                                      np.bincount(codes[usable], weights=w[usable], minlength=n))
+        distributions = {}
+        for name in quantiles:
+            values = columns[name]
+            usable = ~np.isnan(values)
+            distributions[name] = _value_counts(codes[usable], values[usable], np.ones(usable.sum(), dtype=np.int64))
+        return cls(np.asarray(uniques), counts, sums, present, weighted, distributions)
+
+    def rollup(self, parent_keys):
+        """Aggregate these partials into the coarser level given by each key's parent key."""
+        codes, uniques = pd.factorize(parent_keys, sort=True)
+        n = len(uniques)
+
+        def add(values):
+            return np.bincount(codes, weights=values, minlength=n)
+
+        counts = add(self.counts).astype(np.int64)
+        sums = {name: add(values) for name, values in self.sums.items()}
+        present = {name: add(values).astype(np.int64) for name, values in self.present.items()}
+        weighted = {key: (add(total), add(weight)) for key, (total, weight) in self.weighted.items()}
+        distributions = {name: _value_counts(codes[index], values, value_counts)
+                         for name, (index, values, value_counts) in self.distributions.items()}
+        return Partials(np.asarray(uniques), counts, sums, present, weighted, distributions)
+
+    def merge(self, other):
+        """Combine partials of the same level built from different loans (e.g. Fannie and Freddie files)."""
+        keys = np.concatenate([self.keys, other.keys])
+        both = Partials(keys, np.concatenate([self.counts, other.counts]),
+                        {name: np.concatenate([values, other.sums[name]]) for name, values in self.sums.items()},
+                        {name: np.concatenate([values, other.present[name]]) for name, values in self.present.items()},
+                        {key: (np.concatenate([total, other.weighted[key][0]]),
+                               np.concatenate([weight, other.weighted[key][1]]))
+                         for key, (total, weight) in self.weighted.items()},
+                        {name: (np.concatenate([index, other.distributions[name][0] + len(self.keys)]),
+                                np.concatenate([values, other.distributions[name][1]]),
+                                np.concatenate([value_counts, other.distributions[name][2]]))
+                         for name, (index, values, value_counts) in self.distributions.items()})
+        return both.rollup(keys)
+
+    def mean(self, name):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sums[name] / self.present[name]
+
+    def weighted_mean(self, name, weight):
+        total, weights = self.weighted[name, weight]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return total / weights
+
+    def quantile(self, name, q):
+        # linear interpolation between the values at ranks floor(h) and ceil(h), h = (n - 1) * q
+        index, values, value_counts = self.distributions[name]
+        totals = np.bincount(index, weights=value_counts, minlength=len(self.keys)).astype(np.int64)
+        starts = np.concatenate([[0], np.cumsum(totals)[:-1]])
+        cumulative = np.cumsum(value_counts)
+        if len(values) == 0:
+            return np.full(len(self.keys), np.nan)
+
+        def at(rank):
+            # value of the loan at `rank` within each key
+            return values[np.minimum(np.searchsorted(cumulative, starts + rank, side="right"), len(values) - 1)]
+
+        h = (np.maximum(totals, 1) - 1) * q
+        lo, hi = np.floor(h).astype(np.int64), np.ceil(h).astype(np.int64)
+        return np.where(totals > 0, at(lo) + (h - lo) * (at(hi) - at(lo)), np.nan)
+
+
+def _value_counts(index, values, counts):
+    # (key index, value) pairs with their total counts, sorted by key index and value
+    if len(values) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=np.int64)
+    value_codes, uniques = pd.factorize(values, sort=True)
+    pairs = index.astype(np.int64) * len(uniques) + value_codes
+    unique_pairs, inverse = np.unique(pairs, return_inverse=True)
+    totals = np.bincount(inverse, weights=counts).astype(np.int64)
+    return unique_pairs // len(uniques), np.asarray(uniques)[unique_pairs % len(uniques)], totals
+
+
+def parse_metrics(metrics):
+    columns, weights, quantiles = set(), set(), set()
+    for name, spec in metrics.items():
+        column, stat = spec[0], spec[1]
+        columns.add(column)
+        if stat == "mean" and len(spec) == 3:
+            weights.add((column, spec[2]))
+            columns.add(spec[2])
+        elif isinstance(stat, float) and 0 <= stat <= 1:
+            quantiles.add(column)
+        elif stat != "mean":
+            raise ValueError(f"unknown statistic {stat!r} for metric {name!r}, expected 'mean' or a quantile in [0, 1]")
+    return sorted(columns), sorted(weights), sorted(quantiles)
+
+
+def loan_partials(df, metrics=None, include_territories=False):
+    """Partial aggregates of a cleaned frame (see clean_df) per (tract, msa)."""
+    columns, weights, quantiles = parse_metrics(metrics or DEFAULT_METRICS)
+    state = np.asarray(df["state_fips_code"], dtype=np.int64)
+    keep = slice(None) if include_territories else state <= MAX_STATE_FIPS
+    keys = geo_key(state, np.asarray(df["county_fips_code"], dtype=np.int64),
+                   np.asarray(df["census_tract"], dtype=np.int64), np.asarray(df["msa_code"], dtype=np.int64))[keep]
+    values = {name: np.asarray(df[name], dtype=np.float64)[keep] for name in columns}
+    return Partials.from_loans(keys, values, weights, quantiles)
+
+
+def rollups(df, metrics=None, levels=LEVELS, include_territories=False, partials=None):
+    """Return {level: DataFrame of `metrics`} for the requested levels of a cleaned frame.
+
+    Frames are indexed by the zero padded level code (the tract's 11 digit GEOID, the
+    5 digit county and MSA codes, the 2 digit state code). Pass `partials` (e.g. merged
+    from several files with Partials.merge) instead of `df` to skip the grouping pass.
+    """
+    metrics = metrics or DEFAULT_METRICS
+    unknown = set(levels) - set(LEVELS)
+    if unknown:
+        raise ValueError(f"unknown levels {sorted(unknown)}, expected some of {LEVELS}")
+    needed = set(levels)
+    for level in ["state", "county"]:
+        if level in needed:
+            needed.add(DERIVED_FROM[level])
+    by_level = {None: partials if partials is not None else loan_partials(df, metrics, include_territories)}
+    # finer levels first, so each level is derived from already computed partials
+    for level in ["tract", "msa", "county", "state"]:
+        if level in needed:
+            source = by_level[DERIVED_FROM[level]]
+            by_level[level] = source.rollup(parent_key(level, source.keys))
+    return {level: to_frame(by_level[level], level, metrics) for level in levels}
+
+
+def to_frame(partials, level, metrics):
+    index = pd.Index(pd.Series(partials.keys).astype(str).str.zfill(LEVEL_DIGITS[level]).to_numpy(), name=level)
+    columns = {"loans": partials.counts}
+    for name, spec in metrics.items():
+        column, stat = spec[0], spec[1]
+        if stat == "mean":
+            columns[name] = partials.weighted_mean(column, spec[2]) if len(spec) == 3 else partials.mean(column)
+        else:
+            columns[name] = partials.quantile(column, stat)
+    return pd.DataFrame(columns, index=index)
@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/scanner.py. Importing scanner still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import scanner
+
+sys.modules[__name__] = scanner
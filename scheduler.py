@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/scheduler.py. Importing scheduler still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import scheduler
+
+sys.modules[__name__] = scheduler
@@ -0,0 +1,7 @@
+# Moved to fhfa_pudb/streaming_agg.py. Importing streaming_agg still works and gives that module (the same
+# module object, so its settings and caches are shared with the package).
+import sys
+
+from fhfa_pudb import streaming_agg
+
+sys.modules[__name__] = streaming_agg
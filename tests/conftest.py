@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules are top level files in the repository root, and the synthetic data generator is in benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
@@ -0,0 +1,134 @@
+import functools
+import http.server
+import os
+import threading
+
+import pytest
+
+import synthetic_pudb
+from fhfa_pudb.archive_cache import ArchiveCache
+
+DATASET = "Singlefamily-Census-Freddie"
+
+
+class RecordingHandler(http.server.SimpleHTTPRequestHandler):
+    # serves fixture archives (with Last-Modified, and 304 for If-Modified-Since) and records the status codes
+    def log_request(self, code="-", size="-"):
+        self.server.codes.append(int(code))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    root = tmp_path / "srv"
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(RecordingHandler, directory=root))
+    httpd.root = root
+    httpd.codes = []
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def archive_url(server, year):
+    path = synthetic_pudb.write_archive(str(server.root), DATASET, year, rows=200, seed=year)
+    return f"http://127.0.0.1:{server.server_port}/{os.path.relpath(path, server.root)}", path
+
+
+def test_first_fetch_downloads_and_refetch_revalidates(server, tmp_path):
+    url, original = archive_url(server, 2022)
+    cache = ArchiveCache(str(tmp_path / "cache"), offline=False)
+
+    path, downloaded = cache.fetch_status(DATASET, 2022, url)
+    assert server.codes == [200]
+    assert downloaded == os.path.getsize(original)
+    with open(path, "rb") as cached, open(original, "rb") as served:
+        assert cached.read() == served.read()
+
+    assert cache.fetch_status(DATASET, 2022, url) == (path, 0)
+    assert server.codes == [200, 304]
+
+
+def test_changed_archive_is_downloaded_again(server, tmp_path):
+    url, original = archive_url(server, 2022)
+    cache = ArchiveCache(str(tmp_path / "cache"), offline=False)
+    first = cache.fetch(DATASET, 2022, url)
+    synthetic_pudb.write_archive(str(server.root), DATASET, 2022, rows=300, seed=1)
+    os.utime(original, (os.path.getmtime(first) + 10,) * 2)
+    second = cache.fetch(DATASET, 2022, url)
+    assert server.codes == [200, 200]
+    assert second != first
+
+
+def test_replaced_archives_are_deleted(server, tmp_path):
+    url, original = archive_url(server, 2022)
+    blob_dir = tmp_path / "cache" / "blobs"
+    for rows in [200, 300, 400]:
+        synthetic_pudb.write_archive(str(server.root), DATASET, 2022, rows=rows, seed=rows)
+        os.utime(original, (rows * 1000,) * 2) # a new Last-Modified every time
+        # a new cache for every fetch, like separate runs
+        path = ArchiveCache(str(tmp_path / "cache"), offline=False).fetch(DATASET, 2022, url)
+        assert os.listdir(blob_dir) == [os.path.basename(path)]
+    assert server.codes == [200, 200, 200]
+
+    # a blob that isn't in the index, e.g. left by an older version of the cache
+    (blob_dir / ("0" * 64 + ".zip")).write_bytes(b"stale")
+    ArchiveCache(str(tmp_path / "cache")).evict()
+    assert sum(f.stat().st_size for f in blob_dir.iterdir()) == os.path.getsize(original)
+    ArchiveCache(str(tmp_path / "cache")).clear()
+    assert os.listdir(blob_dir) == []
+
+
+def test_offline(server, tmp_path):
+    url, _ = archive_url(server, 2022)
+    path = ArchiveCache(str(tmp_path / "cache"), offline=False).fetch(DATASET, 2022, url)
+
+    offline = ArchiveCache(str(tmp_path / "cache"), offline=True)
+    assert offline.fetch_status(DATASET, 2022, url) == (path, 0)
+    with pytest.raises(FileNotFoundError):
+        offline.fetch(DATASET, 2021, url.replace("2022", "2021"))
+    assert server.codes == [200]
+
+
+def test_stale_copy_served_when_server_is_unreachable(server, tmp_path, capsys):
+    url, _ = archive_url(server, 2022)
+    cache = ArchiveCache(str(tmp_path / "cache"), offline=False, timeout=5)
+    path = cache.fetch(DATASET, 2022, url)
+    server.shutdown()
+    server.server_close()
+
+    assert cache.fetch_status(DATASET, 2022, url) == (path, 0)
+    assert "using cached copy" in capsys.readouterr().out
+    with pytest.raises(OSError):
+        cache.fetch(DATASET, 2021, url.replace("2022", "2021"))
+
+
+def test_least_recently_used_archive_is_evicted(server, tmp_path):
+    urls = {year: archive_url(server, year)[0] for year in [2020, 2021, 2022]}
+    cache = ArchiveCache(str(tmp_path / "cache"), offline=False)
+    paths = {year: cache.fetch(DATASET, year, url) for year, url in urls.items()}
+    cache.fetch(DATASET, 2020, urls[2020]) # 2021 is now the least recently used
+
+    # a new cache (e.g. the next run) that only has room for two of the archives
+    sizes = {year: os.path.getsize(path) for year, path in paths.items()}
+    small = ArchiveCache(str(tmp_path / "cache"), max_bytes=sizes[2020] + sizes[2022], offline=False)
+    assert len(small.evict()) == 1
+    assert not os.path.exists(paths[2021])
+    assert small.cached_path(DATASET, 2021, urls[2021]) is None
+    assert small.cached_path(DATASET, 2020, urls[2020]) == paths[2020]
+    assert small.cached_path(DATASET, 2022, urls[2022]) == paths[2022]
+
+
+def test_returned_archives_are_not_evicted(server, tmp_path, capsys):
+    urls = {year: archive_url(server, year)[0] for year in [2021, 2022]}
+    cache = ArchiveCache(str(tmp_path / "cache"), max_bytes=1000, offline=False)
+    paths = [cache.fetch(DATASET, year, url) for year, url in urls.items()]
+    # both archives are over the cap, but neither is deleted while this cache may still be reading them
+    assert all(os.path.exists(path) for path in paths)
+    assert "larger than the cache size cap" in capsys.readouterr().out
+
+    cache.clear()
+    assert not any(os.path.exists(path) for path in paths)
@@ -0,0 +1,46 @@
+import zipfile
+
+import pandas as pd
+import pyarrow.dataset as ds
+import pytest
+
+from fhfa_pudb.columnar_cache import read_parsed, write_parsed
+from fhfa_pudb.scanner import write_scan_store
+from fhfa_pudb.sources import parse_singlefamily_census
+from synthetic_pudb import census_tract_frame, write_loans
+
+DATASET = "Singlefamily-Census-Freddie"
+MEMBER = "loans.txt"
+
+
+@pytest.fixture
+def overflowing_archive(tmp_path):
+    # the first chunk of 128 rows fits the layout's int32 borrower_income, the second doesn't
+    df = census_tract_frame(400, seed=0)
+    df.loc[200, "borrower_income"] = 3_000_000_000
+    path = tmp_path / "archive.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        with archive.open(MEMBER, "w") as f:
+            write_loans(f, [df])
+    return str(path), df
+
+
+def test_parsed_file_widens_overflowing_column(tmp_path, overflowing_archive):
+    archive, df = overflowing_archive
+    path = str(tmp_path / "parsed" / "loans.parquet")
+    write_parsed(path, archive, MEMBER, parse_singlefamily_census, DATASET, 2021, chunksize=128)
+    parsed = read_parsed(path)
+    assert parsed["borrower_income"].dtype == "int64"
+    assert parsed["census_tract"].dtype == "int32"
+    pd.testing.assert_series_equal(parsed["borrower_income"], df["borrower_income"], check_dtype=False)
+    assert [name for name in (tmp_path / "parsed").iterdir()] == [tmp_path / "parsed" / "loans.parquet"]
+
+
+def test_scan_store_widens_overflowing_column(tmp_path, overflowing_archive):
+    archive, df = overflowing_archive
+    path = str(tmp_path / "scan" / "store")
+    write_scan_store(path, archive, MEMBER, parse_singlefamily_census, DATASET, 2021, chunksize=128)
+    stored = ds.dataset(path, format="parquet", partitioning="hive").to_table().to_pandas()
+    assert stored["borrower_income"].dtype == "int64"
+    assert sorted(stored["borrower_income"]) == sorted(df["borrower_income"])
+    assert [name for name in (tmp_path / "scan").iterdir()] == [tmp_path / "scan" / "store"]
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingClassifier
+
+from explain import feature_matrix, permutation_importances
+from training import encode_ordinal
+
+
+def loans(n=2000, seed=0):
+    # purpose is categorical (coded 1, 2, 9 in the files); the label depends on it alone
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({"purpose": rng.choice([1, 2, 9], n), "noise": rng.normal(size=n)})
+    return frame, (frame["purpose"] == 9).to_numpy().astype(np.int8)
+
+
+def test_dataframes_are_encoded_like_training():
+    frame, _ = loans()
+    X, _ = encode_ordinal(frame, list(frame.columns), dtype=np.float64)
+    np.testing.assert_array_equal(feature_matrix(frame), X)
+    np.testing.assert_array_equal(feature_matrix(frame, encode=False), frame.to_numpy(dtype=np.float64))
+
+
+def test_importances_of_a_model_fitted_on_category_codes():
+    frame, y = loans()
+    X, categorical = encode_ordinal(frame, list(frame.columns))
+    model = HistGradientBoostingClassifier(categorical_features=categorical, max_iter=20, random_state=0).fit(X, y)
+    importances = permutation_importances(model, frame, y, n_repeats=2, cache=False).set_index("Feature")
+    # with the raw codes 1, 2, 9 the model would see category 9 as unknown and score far below 1
+    assert importances.loc["purpose", "Importance"] > 0.3
+    assert abs(importances.loc["noise", "Importance"]) < 0.01
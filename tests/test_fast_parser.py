@@ -0,0 +1,99 @@
+import io
+
+import pandas as pd
+import pytest
+
+from fhfa_pudb.fast_parser import read_loans
+from fhfa_pudb.pudb_schema import SINGLEFAMILY_CENSUS_COLNAMES, SINGLEFAMILY_CENSUS_DTYPES
+from synthetic_pudb import census_tract_frame, write_loans
+
+ENGINES = ["arrow", "pandas"]
+
+
+def loan_file(rows=500, trailing_empty=False):
+    f = io.BytesIO()
+    write_loans(f, [census_tract_frame(rows, seed=0)], trailing_empty=trailing_empty)
+    return f.getvalue()
+
+
+def parse(data, engine, chunksize=None, usecols=None):
+    result = read_loans(io.BytesIO(data), SINGLEFAMILY_CENSUS_COLNAMES, SINGLEFAMILY_CENSUS_DTYPES,
+                        chunksize=chunksize, usecols=usecols, engine=engine)
+    if chunksize is None:
+        return result
+    with result as chunks:
+        return pd.concat(list(chunks), ignore_index=True)
+
+
+def parse_pandas(data):
+    # what parse_singlefamily_census returns
+    return pd.read_csv(io.BytesIO(data), names=SINGLEFAMILY_CENSUS_COLNAMES, delimiter=r"\s+")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("chunksize", [None, 128])
+@pytest.mark.parametrize("trailing_empty", [False, True])
+def test_same_values_as_pandas(engine, chunksize, trailing_empty):
+    data = loan_file(trailing_empty=trailing_empty)
+    # dtypes come from the schema instead of being inferred, so only values are compared
+    pd.testing.assert_frame_equal(parse(data, engine, chunksize), parse_pandas(data), check_dtype=False,
+                                  check_exact=True)
+
+
+def test_trailing_empty_field_is_nan():
+    df = parse(loan_file(trailing_empty=True), "arrow")
+    assert df["qualified_opportunity_zone_tract"].isna().all()
+    assert df["dti"].notna().all()
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_usecols(engine):
+    data = loan_file()
+    df = parse(data, engine, usecols=["dti", "ltv"])
+    assert list(df.columns) == ["ltv", "dti"]
+    pd.testing.assert_frame_equal(df, parse_pandas(data)[["ltv", "dti"]], check_dtype=False)
+
+
+def test_other_whitespace_uses_pandas_engine():
+    data = loan_file()
+    pd.testing.assert_frame_equal(parse(data.replace(b" ", b"\t"), None), parse_pandas(data), check_dtype=False)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("fields", [40, 62, 65])
+def test_wrong_field_count(engine, fields):
+    # every row has `fields` fields; only qualified_opportunity_zone_tract (the 64th) may be missing
+    df = census_tract_frame(100, seed=0)
+    df = df.iloc[:, :fields] if fields < df.shape[1] else df.assign(extra=1)
+    f = io.BytesIO()
+    write_loans(f, [df])
+    with pytest.raises(ValueError, match=f"rows have {fields} fields"):
+        parse(f.getvalue(), engine)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("chunksize", [None, 128])
+@pytest.mark.parametrize("fields", [40, 65])
+def test_wrong_field_count_in_one_row(engine, chunksize, fields):
+    lines = loan_file().split(b"\n")
+    values = lines[300].split()
+    lines[300] = b" ".join(values[:fields] if fields < len(values) else values + [b"1"])
+    with pytest.raises(ValueError):
+        parse(b"\n".join(lines), engine, chunksize)
+
+
+@pytest.mark.parametrize("chunksize", [None, 128])
+@pytest.mark.parametrize("line", [0, 1, 300, 499])
+@pytest.mark.parametrize("whitespace", [b"  ", b"\t", b" \t "])
+def test_other_whitespace_after_the_first_lines(chunksize, line, whitespace):
+    # the engine is chosen from the first line, and the lines from the first irregular one are
+    # read by the pandas engine
+    data = loan_file()
+    lines = data.split(b"\n")
+    lines[line] = whitespace.join(lines[line].split()) + b" "
+    lines[line + 1:line + 3] = [b" " + row for row in lines[line + 1:line + 3]]
+    irregular = b"\n".join(lines)
+    expected = parse_pandas(data)
+    pd.testing.assert_frame_equal(parse(irregular, None, chunksize), expected, check_dtype=False, check_exact=True)
+    pd.testing.assert_frame_equal(parse(irregular, "arrow", chunksize), expected, check_dtype=False,
+                                  check_exact=True)
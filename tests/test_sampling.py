@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fhfa_pudb.sampling import StreamSampler, sample_chunks
+
+
+@pytest.fixture(scope="module")
+def loans():
+    # many small strata, most with fewer than 1 / fraction rows
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 40, 3000)
+    return pd.DataFrame({"group": np.repeat(np.arange(len(sizes)), sizes), "value": rng.random(sizes.sum())}) \
+        .sample(frac=1, random_state=0).reset_index(drop=True)
+
+
+def chunks(df, size):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+
+@pytest.mark.parametrize("fraction", [0.01, 0.1, 0.5])
+def test_stratified_sample_sizes(loans, fraction):
+    sample = sample_chunks(chunks(loans, 10_000), fraction, stratify="group", seed=1)
+    assert len(sample) in (np.floor(fraction * len(loans)), np.ceil(fraction * len(loans)))
+    shares = fraction * loans["group"].value_counts()
+    counts = sample["group"].value_counts().reindex(shares.index, fill_value=0)
+    # every stratum gets its share rounded down or up
+    assert ((counts == np.floor(shares)) | (counts == np.ceil(shares))).all()
+
+
+def test_small_strata_get_their_share_on_average(loans):
+    fraction = 0.01
+    sizes = loans["group"].value_counts()
+    totals = sum(sample_chunks(chunks(loans, 10_000), fraction, stratify="group", seed=seed)["group"]
+                 .value_counts().reindex(sizes.index, fill_value=0) for seed in range(20))
+    # e.g. the strata of fewer than 10 rows, which are too small for even one row at 1%
+    for small in [sizes < 10, sizes < 20, sizes >= 30]:
+        assert totals[small].sum() / 20 == pytest.approx(fraction * sizes[small].sum(), rel=0.1)
+
+
+def test_same_sample_for_any_chunk_size(loans):
+    samples = [sample_chunks(chunks(loans, size), 0.05, stratify="group", seed=3) for size in [777, 100_000]]
+    pd.testing.assert_frame_equal(samples[0], samples[1])
+    assert not samples[0].equals(sample_chunks(chunks(loans, 777), 0.05, stratify="group", seed=4))
+
+
+def test_fixed_size_sample(loans):
+    sample = sample_chunks(chunks(loans, 1000), size=123, seed=0)
+    assert len(sample) == 123
+    assert sample["value"].isin(loans["value"]).all()
+
+
+def test_arguments():
+    with pytest.raises(ValueError):
+        StreamSampler()
+    with pytest.raises(ValueError):
+        StreamSampler(fraction=0.1, size=10)
+    with pytest.raises(ValueError):
+        StreamSampler(size=10, stratify="county")
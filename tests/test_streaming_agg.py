@@ -0,0 +1,68 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from fhfa_pudb.cleaning import clean_df
+from fhfa_pudb.pipeline import get_county_averages
+from fhfa_pudb.streaming_agg import CountyAggregator, ValueCounts
+from synthetic_pudb import census_tract_frame
+
+# the averages are rounded (to 3 decimals, income to whole dollars) after summing in a different
+# order than pandas does, so a value on a rounding boundary can differ in its last decimal
+TOLERANCE = {"dti_avg": 0.001, "ltv_avg": 0.001, "income_estimate": 1, "pct_nonwhite_estimate": 0.001,
+             "pct_first_time_buyer": 0.001}
+
+
+@pytest.fixture(scope="module")
+def raw():
+    return [census_tract_frame(20_000, seed=(0, i), enterprise=i + 1) for i in range(2)]
+
+
+@pytest.fixture(scope="module")
+def expected(raw):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return get_county_averages(clean_df(pd.concat(raw, ignore_index=True), 2022))
+
+
+def assert_close(actual, expected):
+    assert list(actual.columns) == list(expected.columns)
+    pd.testing.assert_index_equal(actual.index, expected.index)
+    for name, tolerance in TOLERANCE.items():
+        assert (actual[name] - expected[name]).abs().max() <= tolerance + 1e-9, name
+
+
+def test_single_pass_matches_clean_df(raw, expected):
+    aggregator = CountyAggregator(2022)
+    for frame in raw:
+        for start in range(0, len(frame), 7_000):
+            aggregator.update(frame.iloc[start:start + 7_000])
+    assert_close(aggregator.result(), expected)
+
+
+def test_merged_aggregators_match_clean_df(raw, expected):
+    # e.g. one aggregator per enterprise, built in different processes
+    parts = [CountyAggregator(2022).update(frame) for frame in raw]
+    assert_close(parts[0].merge(parts[1]).result(), expected)
+
+
+def test_fill_values_are_exact(raw):
+    aggregator = CountyAggregator(2022)
+    for frame in raw:
+        aggregator.update(frame)
+    values = pd.concat(raw, ignore_index=True)
+    fills = aggregator.fill_values()
+    for name in ["tract_median_income", "tract_pct_minority", "ltv"]:
+        # the median clean_df imputes with, of the values that aren't sentinel codes
+        assert fills[name] == np.nanmedian(aggregator._present(values[name], name))
+
+
+@pytest.mark.parametrize("n", [1, 2, 999, 1000])
+def test_value_counts(n):
+    values = np.random.default_rng(n).integers(0, 50, n).astype(float)
+    values[1::7] = np.nan
+    counts = ValueCounts().update(values[:n // 2]).merge(ValueCounts().update(values[n // 2:]))
+    assert counts.median() == pd.Series(values).median()
+    assert counts.mode() == pd.Series(values).mode().iloc[0]
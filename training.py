@@ -0,0 +1,220 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from fhfa_pudb.instrumentation import RSSSampler
+
+# Model training on the full cleaned Census Tract data (see cleaning.clean_df).
+#
+# The experiments in housingDataExperimentsFull.ipynb fit random forests on a 10%
+# sample, and the LTV regressor one-hot encodes 21 categorical columns into a dense
+# int64 frame first. Here:
+#   - encode_ordinal writes the features straight into one float32 matrix, with
+#     categorical columns as their category codes, and encode_sparse one-hot encodes
+#     into a sparse matrix (for linear models)
+#   - train() fits scikit-learn's histogram-based gradient boosting, which bins the
+#     matrix to uint8 once, handles the categorical columns natively and uses all
+#     cores, on as many rows as fit in `memory_budget_mb` (all of them, normally)
+#   - train_baseline() is the notebook's 10% sample random forest, for comparison
+# Both return the fitted model and a report with row counts, encoding and fit time, the
+# peak memory used for encoding and fitting (RSS sampled every 10 ms, above the RSS
+# before encoding) and the test score.
+
+# the categorical columns the notebook one-hot encodes for the LTV regressor
+CATEGORICAL_COLUMNS = ['state_fips_code', 'num_borrowers', 'area_concentrated_poverty', 'property_type', 'rural_tract',
+                       'occupancy_code', 'persistent_poverty_county', 'mississippi_delta_county', 'num_units',
+                       'date_of_note', 'mid_appalachia_county', 'high_opportunity_area', 'purpose', 'term_at_orig',
+                       'federal_guarantee', 'first_time_buyer', 'borrower_age', 'borrower_62+', 'application_channel',
+                       'AUS_name', 'dti_cat']
+
+TASKS = {
+    # DTI category (<= 35% / > 35%) from everything else
+    "dti": {"target": "dti_cat", "kind": "classifier", "drop": ["dti_cat", "dti_num"]},
+    # LTV from everything but the columns the notebook drops: property_value gives ltv away,
+    # dti_num duplicates dti_cat and the geography codes have too many values to one-hot encode
+    "ltv": {"target": "ltv", "kind": "regressor",
+            "drop": ["ltv", "property_value", "dti_num", "county_fips_code", "census_tract", "msa_code"]},
+}
+
+MAX_CATEGORIES = 255 # categorical features of the histogram learners; columns with more values are used as numbers
+DEFAULT_MEMORY_BUDGET_MB = 2048
+BASELINE_FRACTION = 0.10
+
+
+def feature_columns(df, task):
+    return [name for name in df.columns if name not in TASKS[task]["drop"]]
+
+
+def is_categorical(series):
+    return isinstance(series.dtype, pd.CategoricalDtype) or series.name in CATEGORICAL_COLUMNS
+
+
+def encode_ordinal(df, columns, rows=None, dtype=np.float32):
+    """Encode `columns` of `df` (only `rows`, if given) into a float32 (or `dtype`) matrix.
+
+    Categorical columns with at most MAX_CATEGORIES values become their category codes
+    and are flagged in the returned mask; everything else is kept as numbers. The matrix
+    is filled one column at a time, so no other full size copy of the data is made.
+    """
+    n = len(df) if rows is None else len(rows)
+    X = np.empty((n, len(columns)), dtype=dtype)
+    categorical = np.zeros(len(columns), dtype=bool)
+    for i, name in enumerate(columns):
+        series = df[name]
+        if is_categorical(series):
+            codes, uniques = pd.factorize(series, sort=True)
+            if len(uniques) <= MAX_CATEGORIES:
+                categorical[i] = True
+                values = np.where(codes < 0, np.nan, codes) # missing values are -1
+            else:
+                values = np.asarray(series, dtype=np.float64)
+        else:
+            values = np.asarray(series, dtype=np.float64)
+        X[:, i] = values if rows is None else values[rows]
+    return X, categorical
+
+
+def encode_sparse(df, columns, rows=None, drop_first=True):
+    """One-hot encode the categorical `columns` into a sparse CSR matrix next to the numeric ones.
+
+    The sparse version of the notebook's pd.get_dummies(..., drop_first=True). Returns
+    the matrix and its column names.
+    """
+    from scipy import sparse
+
+    rows = np.arange(len(df)) if rows is None else rows
+    blocks, names = [], []
+    for name in columns:
+        series = df[name]
+        if is_categorical(series):
+            codes, uniques = pd.factorize(series, sort=True)
+            codes = codes[rows]
+            first = 1 if drop_first else 0
+            keep = codes >= first
+            block = sparse.csr_matrix((np.ones(keep.sum(), dtype=np.float32), (np.flatnonzero(keep), codes[keep] - first)),
+                                      shape=(len(rows), len(uniques) - first))
+            names += [f"{name}_{value}" for value in uniques[first:]]
+        else:
+            block = sparse.csr_matrix(np.asarray(series, dtype=np.float32)[rows].reshape(-1, 1))
+            names.append(name)
+        blocks.append(block)
+    return sparse.hstack(blocks, format="csr"), names
+
+
+def target(df, task):
+    values = df[TASKS[task]["target"]]
+    if TASKS[task]["kind"] == "classifier":
+        # the notebook's label encoding: '<= 35%' -> 0, '> 35%' -> 1
+        return (np.asarray(values) == '> 35%').astype(np.int8)
+    return np.asarray(values, dtype=np.float64)
+
+
+def bytes_per_row(n_features):
+    # training memory per row, matching what we measured on 1.8M rows: the float32 features,
+    # the estimator's float64 copy of them, the copy made when early stopping splits off its
+    # validation rows, the uint8 binned matrix, and about 64 bytes of gradients, hessians,
+    # predictions and target
+    return n_features * (4 + 8 + 8 + 1) + 64
+
+
+def split_rows(y, n_rows, test_size, classifier, random_state):
+    from sklearn.model_selection import train_test_split
+
+    rows = np.arange(len(y))
+    stratify = y if classifier else None
+    if n_rows < len(y):
+        rows, _ = train_test_split(rows, train_size=n_rows, stratify=stratify, random_state=random_state)
+        stratify = y[rows] if classifier else None
+    return train_test_split(rows, test_size=test_size, stratify=stratify, random_state=random_state)
+
+
+def score(model, X, y, classifier):
+    from sklearn import metrics
+
+    predictions = model.predict(X)
+    if classifier:
+        return {"accuracy": metrics.accuracy_score(y, predictions)}
+    return {"rmse": float(np.sqrt(metrics.mean_squared_error(y, predictions))), "r2": metrics.r2_score(y, predictions)}
+
+
+def train(df, task, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, n_jobs=None, test_size=0.25, random_state=42,
+          **params):
+    """Fit a histogram gradient boosting model for `task` ("dti" or "ltv") on a cleaned frame.
+
+    Uses every row unless the estimated training memory exceeds `memory_budget_mb`, in
+    which case a (stratified) sample that fits is used. `n_jobs` limits the number of
+    threads (all cores by default). Extra keyword arguments go to the estimator.
+    """
+    from sklearn.ensemble import HistGradientBoostingClassifier, HistGradientBoostingRegressor
+    from threadpoolctl import threadpool_limits
+
+    spec = TASKS[task]
+    classifier = spec["kind"] == "classifier"
+    columns = feature_columns(df, task)
+    y = target(df, task)
+    # rows to split into training and test rows, so that the training rows fit the budget
+    n_rows = min(len(df), int(memory_budget_mb * 1e6 / bytes_per_row(len(columns)) / (1 - test_size)))
+    if n_rows < len(df):
+        print(f"warning: {len(df)} rows need more than {memory_budget_mb} MB, training on a sample of {n_rows}")
+
+    with RSSSampler() as memory:
+        start = time.perf_counter()
+        train_rows, test_rows = split_rows(y, n_rows, test_size, classifier, random_state)
+        X_train, categorical = encode_ordinal(df, columns, train_rows)
+        encode_seconds = time.perf_counter() - start
+
+        estimator = HistGradientBoostingClassifier if classifier else HistGradientBoostingRegressor
+        model = estimator(categorical_features=categorical, random_state=random_state, **params)
+        start = time.perf_counter()
+        with threadpool_limits(limits=n_jobs if n_jobs and n_jobs > 0 else None, user_api="openmp"):
+            model.fit(X_train, y[train_rows])
+        fit_seconds = time.perf_counter() - start
+    del X_train
+
+    X_test, _ = encode_ordinal(df, columns, test_rows)
+    report = {"task": task, "model": type(model).__name__, "rows": len(df), "train_rows": len(train_rows),
+              "features": len(columns), "encode_seconds": encode_seconds, "fit_seconds": fit_seconds,
+              "peak_rss_delta_mb": memory.peak_delta_mb}
+    report.update(score(model, X_test, y[test_rows], classifier))
+    return model, report
+
+
+def train_baseline(df, task, fraction=BASELINE_FRACTION, n_jobs=None, random_state=42):
+    """The notebook's experiment: a 100 tree random forest on a `fraction` sample.
+
+    The DTI classifier uses the cleaned columns as they are; the LTV regressor one-hot
+    encodes CATEGORICAL_COLUMNS with pd.get_dummies into a dense int frame (which also
+    truncates ltv to an integer, as in the notebook).
+    """
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    from sklearn.model_selection import train_test_split
+
+    spec = TASKS[task]
+    classifier = spec["kind"] == "classifier"
+    with RSSSampler() as memory:
+        start = time.perf_counter()
+        sample = df.sample(frac=fraction, random_state=random_state)
+        if classifier:
+            y = target(sample, task)
+            X = sample[feature_columns(sample, task)]
+        else:
+            dummies = pd.get_dummies(sample.drop(columns=[name for name in spec["drop"] if name != "ltv"]),
+                                     columns=CATEGORICAL_COLUMNS, drop_first=True).astype(int)
+            y = dummies["ltv"].to_numpy()
+            X = dummies.drop(columns=["ltv"])
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=random_state,
+                                                            stratify=y if classifier else None)
+        encode_seconds = time.perf_counter() - start
+
+        estimator = RandomForestClassifier if classifier else RandomForestRegressor
+        model = estimator(n_estimators=100, random_state=random_state, n_jobs=n_jobs)
+        start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - start
+
+    report = {"task": task, "model": type(model).__name__, "rows": len(df), "train_rows": len(X_train),
+              "features": X.shape[1], "encode_seconds": encode_seconds, "fit_seconds": fit_seconds,
+              "peak_rss_delta_mb": memory.peak_delta_mb}
+    report.update(score(model, X_test, y_test, classifier))
+    return model, report